@@ -1,14 +1,42 @@
 #!/usr/bin/env python
 import os
+import re
 import sys
 import logging
 
+import threading
 import time
+from datetime import datetime
+from functools import partial
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait, TimeoutError as FuturesTimeoutError
 
-from prometheus_client import start_http_server, Metric, REGISTRY
-from prometheus_client.metrics_core import InfoMetricFamily, GaugeMetricFamily
+from prometheus_client import CollectorRegistry, Counter, Histogram, Metric, REGISTRY
+from prometheus_client.metrics_core import CounterMetricFamily, InfoMetricFamily, GaugeMetricFamily
 
 import wazuh
+from wazuh.aioserver import start_async_server
+from wazuh.breaker import CircuitBreakers
+from wazuh.cache import TTLCache
+from wazuh.cardinality import CardinalityGuard
+from wazuh.emitter import Field, FieldEmitter, parse_version
+from wazuh.exposition import ExpositionCache
+from wazuh.health import HealthCheck
+from wazuh.inventory import SEEN_ACTIVE_AT, AgentIndex
+from wazuh.logcursor import LogCursor
+from wazuh.poller import Poller
+from wazuh.ratelimit import with_priority
+from wazuh.scrape import (
+    current_collectors,
+    current_scrape_timeout,
+    time_left,
+    with_deadline,
+    with_scrape_context,
+    with_timeout,
+)
+from wazuh.server import make_app, make_probes, make_responder, start_server
+from wazuh.singleflight import SingleFlight
+from wazuh.snapshot import SnapshotStore
+from wazuh.targets import TargetsHealth, load_targets, merge_families
 
 logger = wazuh.get_logger()
 
@@ -17,13 +45,15 @@ port = ""  # nosec
 user = ""  # nosec
 password = ""  # nosec
 protocol = os.getenv("WAZUH_PROTOCOL", "https")
+targets_file = os.getenv("EXPORTER_TARGETS_FILE")
 try:
     host = os.getenv("WAZUH_API_HOST")
-    port = int(os.getenv("WAZUH_API_PORT"))
+    port = int(os.getenv("WAZUH_API_PORT", default="0"))
     user = os.getenv("WAZUH_API_USERNAME")
     password = os.getenv("WAZUH_API_PASSWORD")
     listen_port = os.getenv("EXPORTER_PORT", default="5000")
-    if not host or not port or not user or not password:
+    # With a targets file the connection settings are per target, the variables above only provide defaults
+    if not targets_file and (not host or not port or not user or not password):
         logger.critical(
             f"System variables are not set, please check."
             f" Wazuh host {host}, Wazuh port {port}, Wazuh api user {user}, Wazuh api password {password}"
@@ -37,502 +67,1125 @@ except KeyError as error:
     sys.exit(2)
 
 login_endpoint = "security/user/authenticate"
+fetch_workers = int(os.getenv("EXPORTER_FETCH_WORKERS", default="10"))
+target_workers = int(os.getenv("EXPORTER_TARGET_WORKERS", default="8"))
+async_server = os.getenv("EXPORTER_ASYNC_SERVER")
+http_workers = int(os.getenv("EXPORTER_HTTP_WORKERS", default="4"))
+prerender = os.getenv("EXPORTER_PRERENDER")
+endpoint_timeout = float(os.getenv("EXPORTER_ENDPOINT_TIMEOUT", default="10"))
+token_renew_before = float(os.getenv("WAZUH_TOKEN_RENEW_BEFORE", default="60"))
+pool_size = int(os.getenv("WAZUH_POOL_SIZE", default=str(fetch_workers)))
+connect_timeout = float(os.getenv("WAZUH_CONNECT_TIMEOUT", default="5"))
+read_timeout = float(os.getenv("WAZUH_READ_TIMEOUT", default="10"))
+retries = int(os.getenv("WAZUH_RETRIES", default="2"))
+retry_backoff = float(os.getenv("WAZUH_RETRY_BACKOFF", default="0.5"))
+background_polling = os.getenv("EXPORTER_BACKGROUND_POLLING")
+poll_interval = float(os.getenv("EXPORTER_POLL_INTERVAL", default="30"))
+poll_intervals = {
+    group: float(os.getenv(f"EXPORTER_POLL_INTERVAL_{group.upper()}", default=str(poll_interval)))
+    for group in ("agents", "stats", "logs", "cluster")
+}
+ready_max_age = float(os.getenv("EXPORTER_READY_MAX_AGE", default="300"))
+prerender_max_age = float(os.getenv("EXPORTER_PRERENDER_MAX_AGE", default=str(poll_interval)))
+agent_metrics_enabled = os.getenv("EXPORTER_AGENT_METRICS")
+agent_metrics_labels = [
+    label.strip()
+    for label in os.getenv("EXPORTER_AGENT_METRICS_LABELS", default="name,node_name,version,status").split(",")
+    if label.strip()
+]
+agent_metrics_max_agents = int(os.getenv("EXPORTER_AGENT_METRICS_MAX_AGENTS", default="50000"))
+agents_page_size = int(os.getenv("WAZUH_AGENTS_PAGE_SIZE", default="500"))
+agent_inventory_enabled = os.getenv("EXPORTER_AGENT_INVENTORY")
+agent_reconcile_interval = float(os.getenv("EXPORTER_AGENT_RECONCILE_INTERVAL", default="600"))
+agent_keepalive_lag = float(os.getenv("EXPORTER_AGENT_KEEPALIVE_LAG", default="60"))
+agent_disconnection_time = float(os.getenv("EXPORTER_AGENT_DISCONNECTION_TIME", default="600"))
+cluster_node_stats = os.getenv("EXPORTER_CLUSTER_NODE_STATS")
+node_fetch_workers = int(os.getenv("EXPORTER_NODE_FETCH_WORKERS", default="12"))
+node_timeout = float(os.getenv("EXPORTER_NODE_TIMEOUT", default="8"))
+# Seconds the node statistics are returned before the endpoint deadline, so the nodes that answered are kept
+node_deadline_margin = 0.25
+scrape_timeout = float(os.getenv("EXPORTER_SCRAPE_TIMEOUT", default=str(endpoint_timeout)))
+scrape_timeout_offset = float(os.getenv("EXPORTER_SCRAPE_TIMEOUT_OFFSET", default="0.5"))
+snapshot_path = os.getenv("EXPORTER_SNAPSHOT_PATH")
+snapshot_interval = float(os.getenv("EXPORTER_SNAPSHOT_INTERVAL", default="60"))
+snapshot_max_age = float(os.getenv("EXPORTER_SNAPSHOT_MAX_AGE", default="86400"))
+rate_limit = float(os.getenv("EXPORTER_RATE_LIMIT", default="0"))
+rate_limit_burst = int(os.getenv("EXPORTER_RATE_LIMIT_BURST", default="20"))
+circuit_failures = int(os.getenv("EXPORTER_CIRCUIT_FAILURES", default="3"))
+circuit_backoff = float(os.getenv("EXPORTER_CIRCUIT_BACKOFF", default="30"))
+circuit_max_backoff = float(os.getenv("EXPORTER_CIRCUIT_MAX_BACKOFF", default="600"))
+max_series_per_family = int(os.getenv("EXPORTER_MAX_SERIES_PER_FAMILY", default="50000"))
+max_label_length = int(os.getenv("EXPORTER_MAX_LABEL_LENGTH", default="1024"))
+series_retention = float(os.getenv("EXPORTER_SERIES_RETENTION", default="3600"))
+log_cursor_enabled = os.getenv("EXPORTER_LOG_CURSOR")
+logs_page_size = int(os.getenv("WAZUH_LOGS_PAGE_SIZE", default="500"))
+log_max_entries = int(os.getenv("EXPORTER_LOG_MAX_ENTRIES", default="10000"))
+log_recent_errors = int(os.getenv("EXPORTER_LOG_RECENT_ERRORS", default="0"))
+daemon_stats_enabled = os.getenv("EXPORTER_DAEMON_STATS")
+daemons = [
+    daemon.strip()
+    for daemon in os.getenv("WAZUH_DAEMONS", default="wazuh-analysisd,wazuh-remoted,wazuh-db").split(",")
+    if daemon.strip()
+]
+# Slow moving endpoints are cached by default, set WAZUH_CACHE_TTL_<ENDPOINT>=0 to always fetch them
+default_cache_ttls = {
+    "api_info": 300,
+    "validate_configuration": 300,
+    "hourly_stats": 300,
+    "nodes_healthcheck": 60,
+    "cluster_nodes": 60,
+}
+cache_ttls = {
+    endpoint: float(os.getenv(f"WAZUH_CACHE_TTL_{endpoint.upper()}", default=str(default_cache_ttls.get(endpoint, 0))))
+    for endpoint in (
+        "agents_overview",
+        "hourly_stats",
+        "manager_stats",
+        "remote_stats",
+        "logs",
+        "analysisd_stats",
+        "validate_configuration",
+        "nodes_healthcheck",
+        "api_info",
+        "agents",
+        "node_stats",
+        "daemon_stats",
+        "cluster_nodes",
+    )
+}
 
+# Lower values get the request budget first once EXPORTER_RATE_LIMIT is reached,
+# set EXPORTER_PRIORITY_<ENDPOINT> to reorder them
+default_priorities = {
+    "api_info": 0,
+    "agents_overview": 0,
+    "manager_stats": 1,
+    "remote_stats": 1,
+    "analysisd_stats": 1,
+    "daemon_stats": 1,
+    "node_stats": 1,
+    "hourly_stats": 2,
+    "nodes_healthcheck": 2,
+    "logs": 3,
+    "log_entries": 3,
+    "validate_configuration": 3,
+    "agents": 4,
+}
+endpoint_priorities = {
+    endpoint: int(os.getenv(f"EXPORTER_PRIORITY_{endpoint.upper()}", default=str(priority)))
+    for endpoint, priority in default_priorities.items()
+}
 
-class WazuhCollector:
-    def __init__(self):
-        logger.info("Start collector")
-
-    @staticmethod
-    # skipcq: PY-R1000
-    def collect():
-        wazuh_connection = wazuh.Wazuh(
-            protocol=protocol,
-            host=host,
-            port=port,
-            login_endpoint=login_endpoint,
-            user=user,
-            password=password,
+
+# Legacy /manager/stats fields dropped by Wazuh 4.7
+STATS_4_7 = (4, 7, 0)
+missing_fields = Counter(
+    "wazuh_exporter_missing_fields",
+    "Fields expected in a Wazuh API response but missing from it",
+    ["endpoint", "field"],
+    registry=None,
+)
+
+
+def agents_metrics(agents):
+    """Build agents overview metrics."""
+    metric = Metric("wazuh_total_agent", "Total Wazuh agents count", "summary")
+    for agent in agents["nodes"]:
+        metric.add_sample("wazuh_agents_count", value=agent["count"], labels={"node_name": agent["node_name"]})
+    yield metric
+    metric = Metric("wazuh_total_group", "Total Wazuh groups count", "summary")
+    for group in agents["groups"]:
+        metric.add_sample("wazuh_agents_group", value=group["count"], labels={"group_name": group["name"]})
+    yield metric
+    metric = Metric("wazuh_agent_status", "Total Wazuh agents by status", "summary")
+
+    # Wazuh >= v4.4
+
+    if "connection" in agents["agent_status"]:
+        agents_path = agents["agent_status"]["connection"]
+    # Legacy Wazuh support (< v4.4)
+    else:
+        agents_path = agents["agent_status"]
+
+    metric.add_sample("wazuh_active_agents", value=agents_path["active"], labels={})
+    metric.add_sample(
+        "wazuh_disconnected_agents",
+        value=agents_path["disconnected"],
+        labels={},
+    )
+    metric.add_sample(
+        "wazuh_never_connected_agents",
+        value=agents_path["never_connected"],
+        labels={},
+    )
+    metric.add_sample(
+        "wazuh_pending_agents", value=agents_path["pending"], labels={}
+    )
+    metric.add_sample("wazuh_total_agents", value=agents_path["total"], labels={})
+    yield metric
+    metric = GaugeMetricFamily("wazuh_agent_version", "Wazuh agent versions", labels=["version"])
+    for version in agents["agent_version"]:
+        metric.add_metric(
+            labels=[version["version"]],
+            value=version["count"],
+        )
+
+    yield metric
+
+    if not os.getenv("SKIP_LAST_REGISTERED_AGENT"):
+        metric = InfoMetricFamily(
+            "last_registered_agent", "Wazuh last registered agent"
         )
-        auth = wazuh_connection.login()
-        agents = wazuh_connection.wazuh_get_agents_overview(auth)
-        manager_stats_hourly = wazuh_connection.wazuh_get_hourly_stats(auth)
-        manager_stats = wazuh_connection.wazuh_get_stats(auth)
-        remote_stats = wazuh_connection.wazuh_get_remote_stats(auth)
-        get_logs = wazuh_connection.wazuh_get_logs(auth)
-        analysisd_stats = wazuh_connection.wazuh_get_analysisd_stats(auth)
-        validate_configuration = wazuh_connection.wazuh_validate_configuration(auth)
-        metric = Metric("wazuh_total_agent", "Total Wazuh agents count", "summary")
-        for agent in agents["nodes"]:
-            metric.add_sample("wazuh_agents_count", value=agent["count"], labels={"node_name": agent["node_name"]})
+        for version in agents["last_registered_agent"]:
+            if version["status"] == "never_connected":
+                logging.warning(
+                    f'Last Wazuh agent with name {version["name"]} has status {version["status"]},'
+                    f"last_registered_agent metric has been skipped please check agent."
+                    f"Full agent trace {version}"
+                )
+            else:
+                for key, value in version["os"].items():
+                    node_name = version["node_name"]
+                    node_value = f'{version["node_name"]}-{key}'
+                    prom_node_name_format = node_name.replace("-", "_")
+                    prom_node_value_format = node_value.replace("-", "_")
+
+                    metric.add_metric(
+                        labels=prom_node_name_format,
+                        value={prom_node_value_format: f"{value}"},
+                    )
         yield metric
-        metric = Metric("wazuh_total_group", "Total Wazuh groups count", "summary")
-        for group in agents["groups"]:
-            metric.add_sample("wazuh_agents_group", value=group["count"], labels={"group_name": group["name"]})
+
+
+def hourly_stats_metrics(manager_stats_hourly):
+    """Build hourly manager statistics metrics."""
+    metric = InfoMetricFamily(
+        "manager_stats_hourly",
+        "Wazuh statistical information per hour. "
+        "Each number in the averages field represents the average of alerts per hour",
+    )
+    metric.add_sample(
+        "total_affected_items",
+        value=manager_stats_hourly["total_affected_items"],
+        labels={},
+    )
+    metric.add_sample(
+        "total_failed_items",
+        value=manager_stats_hourly["total_failed_items"],
+        labels={},
+    )
+    yield metric
+
+
+def nodes_healthcheck_metrics(nodes):
+    """Build cluster nodes healthcheck metrics."""
+    metric = InfoMetricFamily("nodes_healthcheck", "Wazuh nodes healthcheck", labels=["node_name"])
+    for node in nodes:
+        infos = { k:str(v) for (k, v) in node["info"].items() if k != "name" and k!= "n_active_agents" }
+        metric.add_metric(
+            labels=[node["info"]["name"]], value=infos
+        )
+    # Nothing to export when the cluster is disabled
+    if nodes:
         yield metric
-        metric = Metric("wazuh_agent_status", "Total Wazuh agents by status", "summary")
 
-        # Wazuh >= v4.4
 
-        if "connection" in agents["agent_status"]:
-            agents_path = agents["agent_status"]["connection"]
-        # Legacy Wazuh support (< v4.4)
-        else:
-            agents_path = agents["agent_status"]
+def api_info_metrics(info):
+    """Build Wazuh API information metrics."""
+    if not os.getenv("SKIP_WAZUH_API_INFO"):
+        metric = InfoMetricFamily("wazuh_api", "Wazuh API information")
+        for key, value in info.items():
+            metric.add_metric(labels="wazuh_api_version", value={str(key): str(value)})
+        yield metric
+
+
+def manager_stats_family():
+    return Metric(
+        "manager_stats_total",
+        "Wazuh statistical information for the current date",
+        "summary",
+    )
+
 
-        metric.add_sample("wazuh_active_agents", value=agents_path["active"], labels={})
+def add_manager_stats(metric, manager_stats, labels):
+    for stats in manager_stats:
         metric.add_sample(
-            "wazuh_disconnected_agents",
-            value=agents_path["disconnected"],
-            labels={},
+            f'total_alerts_hour_{stats["hour"]}',
+            value=stats["totalAlerts"],
+            labels=labels,
         )
         metric.add_sample(
-            "wazuh_never_connected_agents",
-            value=agents_path["never_connected"],
-            labels={},
+            f'total_syscheck_hour_{stats["hour"]}',
+            value=stats["syscheck"],
+            labels=labels,
         )
         metric.add_sample(
-            "wazuh_pending_agents", value=agents_path["pending"], labels={}
+            f'total_firewall_hour_{stats["hour"]}',
+            value=stats["firewall"],
+            labels=labels,
         )
-        metric.add_sample("wazuh_total_agents", value=agents_path["total"], labels={})
-        yield metric
-        metric = GaugeMetricFamily("wazuh_agent_version", "Wazuh agent versions", labels=["version"])
-        for version in agents["agent_version"]:
+        metric.add_sample(
+            f'total_events_hour_{stats["hour"]}',
+            value=stats["events"],
+            labels=labels,
+        )
+
+
+def manager_stats_metrics(manager_stats):
+    """Build manager statistics metrics for the current date."""
+    metric = manager_stats_family()
+    add_manager_stats(metric, manager_stats, {})
+    yield metric
+
+
+remote_stats_emitter = FieldEmitter(
+    "remote_stats",
+    "manager_stats_remote",
+    "Wazuh remoted statistical information",
+    label="manager_stats_remote",
+    fields=(
+        Field("queue_size"),
+        Field("total_queue_size"),
+        Field("tcp_sessions"),
+        Field("evt_count"),
+        Field("ctrl_msg_count"),
+        Field("discarded_count"),
+        Field("queued_msgs", until=STATS_4_7),
+        Field("recv_bytes"),
+        Field("dequeued_after_close"),
+    ),
+)
+
+
+def remote_stats_metrics(remote_stats, info):
+    """Build remoted statistics metrics."""
+    yield remote_stats_emitter.emit(remote_stats, parse_version(info.get("api_version")), missing_fields)
+
+
+def logs_metrics(get_logs):
+    """Build last logs metrics."""
+    if not os.getenv("SKIP_LAST_LOGS", default = ""):
+        metric = InfoMetricFamily("last_logs", "The last 2000 wazuh log entries")
+        for log in get_logs:
             metric.add_metric(
-                labels=[version["version"]],
-                value=version["count"],
+                labels=f'wazuh_last_logs_{log["tag"]}',
+                value={
+                    f'{log["tag"].replace("-", "_").replace(":", "_")}_{log["level"]}': f'{log["description"].strip()}'
+                },
             )
-
         yield metric
 
-        if not os.getenv("SKIP_LAST_REGISTERED_AGENT"):
-            metric = InfoMetricFamily(
-                "last_registered_agent", "Wazuh last registered agent"
-            )
-            for version in agents["last_registered_agent"]:
-                if version["status"] == "never_connected":
-                    logging.warning(
-                        f'Last Wazuh agent with name {version["name"]} has status {version["status"]},'
-                        f"last_registered_agent metric has been skipped please check agent."
-                        f"Full agent trace {version}"
-                    )
-                else:
-                    for key, value in version["os"].items():
-                        node_name = version["node_name"]
-                        node_value = f'{version["node_name"]}-{key}'
-                        prom_node_name_format = node_name.replace("-", "_")
-                        prom_node_value_format = node_value.replace("-", "_")
-
-                        metric.add_metric(
-                            labels=prom_node_name_format,
-                            value={prom_node_value_format: f"{value}"},
-                        )
-            yield metric
 
-        metric = InfoMetricFamily(
-            "manager_stats_hourly",
-            "Wazuh statistical information per hour. "
-            "Each number in the averages field represents the average of alerts per hour",
-        )
-        metric.add_sample(
-            "total_affected_items",
-            value=manager_stats_hourly["total_affected_items"],
-            labels={},
-        )
-        metric.add_sample(
-            "total_failed_items",
-            value=manager_stats_hourly["total_failed_items"],
-            labels={},
+def log_entries_metrics(log_entries):
+    """Build log entry counters from the incremental log cursor."""
+    counts, recent = log_entries
+    metric = CounterMetricFamily(
+        "wazuh_manager_log_entries", "Wazuh manager log entries by tag and level", labels=["tag", "level"]
+    )
+    for (tag, level), count in sorted(counts.items()):
+        metric.add_metric([tag, level], count)
+    yield metric
+    if log_recent_errors > 0:
+        metric = GaugeMetricFamily(
+            "wazuh_manager_recent_error_timestamp_seconds",
+            f"Timestamp of the last {log_recent_errors} Wazuh manager error log entries",
+            labels=["tag", "level", "description"],
         )
+        for log in recent:
+            timestamp = wazuh_timestamp(log["timestamp"])
+            if timestamp is not None:
+                metric.add_metric([log["tag"], log["level"], log["description"].strip()], timestamp)
         yield metric
-        metric = InfoMetricFamily("nodes_healthcheck", "Wazuh nodes healthcheck", labels=["node_name"])
-        nodes = wazuh_connection.wazuh_get_nodes_healtchecks(auth)
-        if nodes is not None:
-            for node in nodes:
-                infos = { k:str(v) for (k, v) in node["info"].items() if k != "name" and k!= "n_active_agents" }
-                metric.add_metric(
-                    labels=[node["info"]["name"]], value=infos
-                )
-            yield metric
 
-        info = wazuh_connection.wazuh_api_info(auth)
-        if not os.getenv("SKIP_WAZUH_API_INFO"):
-            metric = InfoMetricFamily("wazuh_api", "Wazuh API information")
-            for key, value in info.items():
-                metric.add_metric(labels="wazuh_api_version", value={str(key): str(value)})
+
+analysisd_stats_emitter = FieldEmitter(
+    "analysisd_stats",
+    "analysisd_stats",
+    "Wazuh analysisd statistical information",
+    label="analysisd_stats",
+    sample_name="analysisd_stats",
+    fields=(
+        Field("total_events_decoded"),
+        Field("syscheck_events_decoded"),
+        Field("syscheck_edps", until=STATS_4_7),
+        Field("syscollector_edps", until=STATS_4_7),
+        Field("rootcheck_edps", until=STATS_4_7),
+        Field("sca_edps", until=STATS_4_7),
+        Field("hostinfo_events_decoded", until=STATS_4_7),
+        Field("hostinfo_edps", until=STATS_4_7),
+        Field("winevt_edps", until=STATS_4_7),
+        Field("dbsync_mdps", until=STATS_4_7),
+        Field("other_events_edps", until=STATS_4_7),
+        Field("events_edps", until=STATS_4_7),
+        Field("syscollector_events_decoded"),
+        Field("rootcheck_events_decoded"),
+        Field("sca_events_decoded"),
+        Field("winevt_events_decoded"),
+        Field("dbsync_messages_dispatched"),
+        Field("other_events_decoded"),
+        Field("events_processed"),
+        Field("events_received"),
+        Field("events_dropped"),
+        Field("alerts_written"),
+        Field("firewall_written"),
+        Field("fts_written"),
+        Field("syscheck_queue_usage"),
+        Field("syscheck_queue_size"),
+        Field("syscollector_queue_usage"),
+        Field("syscollector_queue_size"),
+        Field("rootcheck_queue_usage"),
+        Field("rootcheck_queue_size"),
+        Field("sca_queue_usage"),
+        Field("sca_queue_size"),
+        Field("hostinfo_queue_usage"),
+        Field("hostinfo_queue_size"),
+        Field("winevt_queue_usage"),
+        Field("dbsync_queue_usage"),
+        Field("dbsync_queue_size"),
+        Field("upgrade_queue_usage"),
+        Field("upgrade_queue_size"),
+        Field("event_queue_usage"),
+        Field("event_queue_size"),
+        Field("rule_matching_queue_usage"),
+        Field("rule_matching_queue_size"),
+        Field("alerts_queue_usage"),
+        Field("alerts_queue_size"),
+        Field("firewall_queue_usage"),
+        Field("statistical_queue_usage"),
+        Field("statistical_queue_size"),
+        Field("archives_queue_usage"),
+        Field("archives_queue_size"),
+    ),
+)
+
+
+def analysisd_stats_metrics(analysisd_stats, info):
+    """Build analysisd statistics metrics."""
+    yield analysisd_stats_emitter.emit(analysisd_stats, parse_version(info.get("api_version")), missing_fields)
+
+
+def node_stats_metrics(node_stats, info):
+    """Build per cluster node statistics metrics, labelled by node_name."""
+    version = parse_version(info.get("api_version"))
+    analysisd = remote = None
+    manager_stats = manager_stats_family()
+    for node, kind, items in node_stats:
+        labels = () if node is None else (("node_name", node),)
+        if kind == "analysisd":
+            analysisd = analysisd_stats_emitter.emit(items, version, missing_fields, labels, metric=analysisd)
+        elif kind == "remoted":
+            remote = remote_stats_emitter.emit(items, version, missing_fields, labels, metric=remote)
+        else:
+            add_manager_stats(manager_stats, items, dict(labels))
+    for metric in (analysisd, remote, manager_stats):
+        if metric is not None:
             yield metric
 
-        metric = Metric(
-            "manager_stats_total",
-            "Wazuh statistical information for the current date",
-            "summary",
+
+# Daemon statistics holding a current value, every other statistic is a counter
+DAEMON_GAUGES = frozenset(["tcp_sessions"])
+
+
+def flatten_daemon_metrics(metrics, path=(), breakdown=False):
+    """
+    Flatten nested daemon statistics into (family name, type, value) tuples.
+    The values of a breakdown go to the family of the broken down path with the suffix breakdown and their key
+    as type, e.g. events.received_breakdown.decoded_breakdown.agent becomes events_received_decoded_breakdown with
+    type agent, so that a family never holds a total next to its own breakdown. Other values have no type.
+    """
+    for key, value in metrics.items():
+        nested = key.endswith("_breakdown")
+        if nested:
+            key = key[: -len("_breakdown")]
+        if isinstance(value, dict):
+            yield from flatten_daemon_metrics(value, path + (key,), breakdown or nested)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if breakdown:
+                yield "_".join(path + ("breakdown",)), key, value
+            else:
+                yield "_".join(path + (key,)), None, value
+
+
+def daemon_stats_metrics(daemon_stats):
+    """Build Wazuh >= 4.7 daemon statistics metrics, one family per statistic."""
+    node_label = ["node_name"] if any(node is not None for node, _ in daemon_stats) else []
+    families = {}
+    queue_size = GaugeMetricFamily(
+        "wazuh_daemon_queue_size", "Wazuh daemon queue capacity", labels=["daemon", "queue"] + node_label
+    )
+    queue_usage = GaugeMetricFamily(
+        "wazuh_daemon_queue_usage", "Wazuh daemon queue usage ratio", labels=["daemon", "queue"] + node_label
+    )
+    start_time = GaugeMetricFamily(
+        "wazuh_daemon_start_time_seconds", "Wazuh daemon start time", labels=["daemon"] + node_label
+    )
+    for node, items in daemon_stats:
+        node_value = [] if node is None else [node]
+        for daemon in items:
+            name = daemon["name"]
+            metrics = dict(daemon.get("metrics", {}))
+            for queue, usage in metrics.pop("queues", {}).items():
+                queue_size.add_metric([name, queue] + node_value, usage.get("size", 0))
+                queue_usage.add_metric([name, queue] + node_value, usage.get("usage", 0))
+            for metric, kind, value in flatten_daemon_metrics(metrics):
+                family = families.get(metric)
+                if family is None:
+                    labels = ["daemon"] + (["type"] if kind is not None else []) + node_label
+                    family_type = GaugeMetricFamily if metric in DAEMON_GAUGES else CounterMetricFamily
+                    family = families[metric] = family_type(
+                        f"wazuh_daemon_{re.sub(r'[^a-zA-Z0-9_]', '_', metric)}",
+                        f"Wazuh daemon statistic {metric.replace('_breakdown', ' by type')}",
+                        labels=labels,
+                    )
+                family.add_metric([name] + ([kind] if kind is not None else []) + node_value, value)
+            started = wazuh_timestamp(daemon.get("uptime"))
+            if started is not None:
+                start_time.add_metric([name] + node_value, started)
+    for metric in sorted(families):
+        yield families[metric]
+    yield queue_size
+    yield queue_usage
+    yield start_time
+
+
+def validate_configuration_metrics(validate_configuration):
+    """Build configuration validation metrics."""
+    metric = InfoMetricFamily(
+        "wazuh_validate_configuration",
+        "Return whether the Wazuh configuration is correct",
+    )
+    for validate in validate_configuration:
+        metric.add_metric(
+            labels=f'wazuh_{validate["name"]}',
+            value={
+                "status": f'{validate["status"].strip()}',
+                "node_name": f'{validate["name"]}',
+            },
         )
-        for stats in manager_stats:
-            metric.add_sample(
-                f'total_alerts_hour_{stats["hour"]}',
-                value=stats["totalAlerts"],
-                labels={},
-            )
-            metric.add_sample(
-                f'total_syscheck_hour_{stats["hour"]}',
-                value=stats["syscheck"],
-                labels={},
-            )
-            metric.add_sample(
-                f'total_firewall_hour_{stats["hour"]}',
-                value=stats["firewall"],
-                labels={},
-            )
-            metric.add_sample(
-                f'total_events_hour_{stats["hour"]}',
-                value=stats["events"],
-                labels={},
+    yield metric
+
+
+def wazuh_timestamp(value):
+    """Convert a Wazuh date to a unix timestamp."""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def agent_rows(agents):
+    """
+    Reduce streamed agents to the label values and keepalive of the per-agent metrics
+    :param agents: agent iterator
+    :return:
+    list of (label values, last keepalive timestamp, seen active timestamp) tuples, the last one is only known
+    to the agent inventory
+    """
+    rows = []
+    for agent in agents:
+        if len(rows) >= agent_metrics_max_agents:
+            logger.warning(f"More than {agent_metrics_max_agents} agents, per-agent metrics are truncated")
+            break
+        labels = [agent["id"]] + [str(agent.get(label, "")) for label in agent_metrics_labels]
+        rows.append(
+            (
+                labels,
+                wazuh_timestamp(agent.get("lastKeepAlive")),
+                wazuh_timestamp(agent.get(SEEN_ACTIVE_AT)),
             )
-        yield metric
-        metric = Metric(
-            "manager_stats_remote", "Wazuh remoted statistical information", "summary"
         )
-        for remote_state in remote_stats:
-            metric.add_sample(
-                "queue_size",
-                value=remote_state["queue_size"],
-                labels={"manager_stats_remote": "queue_size"},
-            )
-            metric.add_sample(
-                "total_queue_size",
-                value=remote_state["total_queue_size"],
-                labels={"manager_stats_remote": "total_queue_size"},
-            )
-            metric.add_sample(
-                "tcp_sessions",
-                value=remote_state["tcp_sessions"],
-                labels={"manager_stats_remote": "tcp_sessions"},
-            )
-            metric.add_sample(
-                "evt_count",
-                value=remote_state["evt_count"],
-                labels={"manager_stats_remote": "evt_count"},
-            )
-            metric.add_sample(
-                "ctrl_msg_count",
-                value=remote_state["ctrl_msg_count"],
-                labels={"manager_stats_remote": "ctrl_msg_count"},
-            )
-            metric.add_sample(
-                "discarded_count",
-                value=remote_state["discarded_count"],
-                labels={"manager_stats_remote": "discarded_count"},
-            )
-            if info.get("api_version") < "4.7.0":
-                metric.add_sample(
-                    "queued_msgs",
-                    value=remote_state["queued_msgs"],
-                    labels={"manager_stats_remote": "queued_msgs"},
-                )
-            metric.add_sample(
-                "recv_bytes",
-                value=remote_state["recv_bytes"],
-                labels={"manager_stats_remote": "recv_bytes"},
-            )
-            metric.add_sample(
-                "dequeued_after_close",
-                value=remote_state["dequeued_after_close"],
-                labels={"manager_stats_remote": "dequeued_after_close"},
-            )
-        yield metric
+    return rows
 
-        if not os.getenv("SKIP_LAST_LOGS", default = ""):
-            metric = InfoMetricFamily("last_logs", "The last 2000 wazuh log entries")
-            for log in get_logs:
-                metric.add_metric(
-                    labels=f'wazuh_last_logs_{log["tag"]}',
-                    value={
-                        f'{log["tag"].replace("-", "_").replace(":", "_")}_{log["level"]}': f'{log["description"].strip()}'
-                    },
-                )
-            yield metric
 
-        metric = Metric(
-            "analysisd_stats", "Wazuh analysisd statistical information", "summary"
+def per_agent_metrics(rows):
+    """Build per-agent metrics."""
+    info = GaugeMetricFamily("wazuh_agent_info", "Wazuh agent information", labels=["id"] + agent_metrics_labels)
+    keepalive = GaugeMetricFamily(
+        "wazuh_agent_last_keepalive_timestamp_seconds",
+        "Last keepalive received from the Wazuh agent",
+        labels=["id"],
+    )
+    seen_active = GaugeMetricFamily(
+        "wazuh_agent_seen_active_timestamp_seconds",
+        "Latest time the Wazuh agent was known to keep alive, at most EXPORTER_AGENT_KEEPALIVE_LAG before the sync",
+        labels=["id"],
+    )
+    for labels, last_keepalive, seen_active_at in rows:
+        info.add_metric(labels=labels, value=1)
+        if last_keepalive is not None:
+            keepalive.add_metric(labels=labels[:1], value=last_keepalive)
+        if seen_active_at is not None:
+            seen_active.add_metric(labels=labels[:1], value=seen_active_at)
+    yield info
+    yield keepalive
+    if agent_inventory_enabled:
+        yield seen_active
+
+
+# Each section is built as soon as every endpoint it needs has answered.
+# Named collectors, a scrape can select some of them with collect[] parameters
+sections = (
+    ("agents", ("agents_overview",), agents_metrics),
+    ("hourly_stats", ("hourly_stats",), hourly_stats_metrics),
+    ("nodes_healthcheck", ("nodes_healthcheck",), nodes_healthcheck_metrics),
+    ("api_info", ("api_info",), api_info_metrics),
+    ("manager_stats", ("manager_stats",), manager_stats_metrics),
+    ("remoted", ("remote_stats", "api_info"), remote_stats_metrics),
+    ("logs", ("logs",), logs_metrics),
+    ("log_entries", ("log_entries",), log_entries_metrics),
+    ("analysisd", ("analysisd_stats", "api_info"), analysisd_stats_metrics),
+    ("validate_configuration", ("validate_configuration",), validate_configuration_metrics),
+    ("agent_info", ("agents",), per_agent_metrics),
+    ("node_stats", ("node_stats", "api_info"), node_stats_metrics),
+    ("daemon_stats", ("daemon_stats",), daemon_stats_metrics),
+)
+
+# Endpoints refreshed together in background polling mode
+endpoint_groups = {
+    "agents": ("agents_overview", "agents"),
+    "stats": ("hourly_stats", "manager_stats", "remote_stats", "analysisd_stats", "node_stats", "daemon_stats"),
+    "logs": ("logs", "log_entries"),
+    "cluster": ("nodes_healthcheck", "validate_configuration", "api_info"),
+}
+
+
+def gather(executor, calls, timeout, call_timeout=None):
+    """
+    Run calls concurrently on executor and collect them until timeout
+    :param calls: mapping of key to callable
+    :param timeout: seconds to collect the calls, None for no limit
+    :param call_timeout: seconds each call has from the moment a worker starts it, None for no limit
+    :return:
+    generator of (key, ok, data) in completion order, data is the raised error when not ok,
+    a TimeoutError for the calls still running at their timeout
+    """
+    end = None if timeout is None else time.monotonic() + timeout
+    started = {}
+
+    def run(key, call):
+        started[key] = time.monotonic()
+        return call()
+
+    futures = {executor.submit(run, key, call): key for key, call in calls.items()}
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        wake = end
+        for future in list(pending):
+            key = futures[future]
+            limit = end
+            if call_timeout is not None and key in started:
+                limit = started[key] + call_timeout if end is None else min(end, started[key] + call_timeout)
+            if limit is None or future.done():
+                continue
+            if now >= limit:
+                pending.discard(future)
+                future.cancel()
+                yield key, False, FuturesTimeoutError(f"No answer within {timeout if limit == end else call_timeout}s")
+            elif wake is None or limit < wake:
+                wake = limit
+        if not pending:
+            return
+        done, pending = wait(pending, timeout=None if wake is None else wake - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                yield futures[future], True, future.result()
+            except Exception as error:
+                yield futures[future], False, error
+
+
+def build_ready(results, pending, outcomes):
+    """
+    Build every pending section whose endpoints are all in results and drop it from pending
+    :param outcomes: receives (built, monotonic time) by section name, a failing section does not fail the others
+    """
+    for section in [section for section in pending if all(r in results for r in section[1])]:
+        pending.remove(section)
+        name, requires, build = section
+        data = [results[r] for r in requires]
+        if any(d is None for d in data):
+            logger.warning(f"Skip {build.__name__}, required endpoints {requires} returned no data")
+            outcomes[name] = (False, time.monotonic())
+            continue
+        try:
+            families = list(build(*data))
+        except Exception as error:
+            logger.warning(f"Failed to build {build.__name__}: {error!r}")
+            outcomes[name] = (False, time.monotonic())
+            continue
+        outcomes[name] = (True, time.monotonic())
+        yield from families
+
+
+def scrape_budget():
+    """
+    :return:
+    seconds left to the collection of the current scrape, from the scraper timeout or EXPORTER_SCRAPE_TIMEOUT
+    """
+    timeout = current_scrape_timeout()
+    if timeout is None:
+        return scrape_timeout
+    return max(0.1, timeout - scrape_timeout_offset)
+
+
+def scrape_key():
+    """
+    :return:
+    single-flight key of the scrapes able to share a collection, the ones selecting the same collectors with the
+    same budget, a scrape never waits past its own deadline nor gets a collection cut short by another one
+    """
+    return "collect", current_collectors(), current_scrape_timeout()
+
+
+def seconds_left(deadline):
+    """
+    :param deadline: time.monotonic() value, None for no deadline
+    :return:
+    seconds until deadline, at least 0, None without deadline
+    """
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class WazuhCollector:
+    def __init__(self, target=None, executor=None, node_executor=None):
+        """
+        :param target: connection settings of the Wazuh manager, the WAZUH_API_* variables when None
+        :param executor: pool running the endpoint requests, shared by every target in multi-target mode
+        :param node_executor: pool running the per-node requests, shared like executor
+        """
+        target_name = None if target is None else target["name"]
+        if target is None:
+            target = {"name": host, "protocol": protocol, "host": host, "port": port, "user": user, "password": password}
+        self.name = target["name"]
+        logger.info(f"Start collector for {self.name}")
+        self.executor = executor or ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="wazuh-fetch")
+        self.wazuh_connection = wazuh.Wazuh(
+            protocol=target["protocol"],
+            host=target["host"],
+            port=target["port"],
+            login_endpoint=login_endpoint,
+            user=target["user"],
+            password=target["password"],
+            token_renew_before=token_renew_before,
+            pool_size=pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries=retries,
+            retry_backoff=retry_backoff,
+            # The circuit breakers stop calling a failing endpoint, retrying its errors would only add load
+            retry_status=not circuit_failures,
+            rate_limit=rate_limit,
+            rate_limit_burst=rate_limit_burst,
         )
-        for analysisd_stat in analysisd_stats:
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["total_events_decoded"],
-                labels={"analysisd_stats": "total_events_decoded"},
+        self.endpoints = {
+            "agents_overview": self.wazuh_connection.wazuh_get_agents_overview,
+            "hourly_stats": self.wazuh_connection.wazuh_get_hourly_stats,
+            "manager_stats": self.wazuh_connection.wazuh_get_stats,
+            "remote_stats": self.wazuh_connection.wazuh_get_remote_stats,
+            "logs": self.wazuh_connection.wazuh_get_logs,
+            "analysisd_stats": self.wazuh_connection.wazuh_get_analysisd_stats,
+            "validate_configuration": self.wazuh_connection.wazuh_validate_configuration,
+            "nodes_healthcheck": self.wazuh_connection.wazuh_get_nodes_healtchecks,
+            "api_info": self.wazuh_connection.wazuh_api_info,
+        }
+        if cluster_node_stats:
+            for name in ("manager_stats", "remote_stats", "analysisd_stats"):
+                del self.endpoints[name]
+            self.endpoints["node_stats"] = self.fetch_node_stats
+        if cluster_node_stats or daemon_stats_enabled:
+            self.node_executor = node_executor or ThreadPoolExecutor(
+                max_workers=node_fetch_workers, thread_name_prefix="wazuh-node"
             )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["syscheck_events_decoded"],
-                labels={"analysisd_stats": "syscheck_events_decoded"},
+        if daemon_stats_enabled:
+            # The daemon statistics replace the legacy analysisd and remoted statistics
+            self.endpoints.pop("remote_stats", None)
+            self.endpoints.pop("analysisd_stats", None)
+            self.endpoints["daemon_stats"] = self.fetch_daemon_stats
+        self.log_cursor = None
+        if log_cursor_enabled:
+            # The log counters replace the last_logs info metric and its unbounded label values
+            del self.endpoints["logs"]
+            self.log_cursor = LogCursor(
+                self.wazuh_connection,
+                page_size=logs_page_size,
+                max_entries=log_max_entries,
+                recent_errors=log_recent_errors,
             )
-            if info.get("api_version") < "4.7.0":
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["syscheck_edps"],
-                    labels={"analysisd_stats": "syscheck_edps"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["syscollector_edps"],
-                    labels={"analysisd_stats": "syscollector_edps"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["rootcheck_edps"],
-                    labels={"analysisd_stats": "rootcheck_edps"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["sca_edps"],
-                    labels={"analysisd_stats": "sca_edps"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["hostinfo_events_decoded"],
-                    labels={"analysisd_stats": "hostinfo_events_decoded"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["hostinfo_edps"],
-                    labels={"analysisd_stats": "hostinfo_edps"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["winevt_edps"],
-                    labels={"analysisd_stats": "winevt_edps"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["dbsync_mdps"],
-                    labels={"analysisd_stats": "dbsync_mdps"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["other_events_edps"],
-                    labels={"analysisd_stats": "other_events_edps"},
-                )
-                metric.add_sample(
-                    "analysisd_stats",
-                    value=analysisd_stat["events_edps"],
-                    labels={"analysisd_stats": "events_edps"},
+            self.endpoints["log_entries"] = self.log_cursor.poll
+        self.agent_index = None
+        if agent_metrics_enabled:
+            self.endpoints["agents"] = self.fetch_agents
+            if agent_inventory_enabled:
+                self.agent_index = AgentIndex(
+                    self.wazuh_connection,
+                    ["lastKeepAlive", *agent_metrics_labels],
+                    page_size=agents_page_size,
+                    reconcile_interval=agent_reconcile_interval,
+                    keepalive_lag=agent_keepalive_lag,
+                    disconnection_time=agent_disconnection_time,
                 )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["syscollector_events_decoded"],
-                labels={"analysisd_stats": "syscollector_events_decoded"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["rootcheck_events_decoded"],
-                labels={"analysisd_stats": "rootcheck_events_decoded"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["sca_events_decoded"],
-                labels={"analysisd_stats": "sca_events_decoded"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["winevt_events_decoded"],
-                labels={"analysisd_stats": "winevt_events_decoded"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["dbsync_messages_dispatched"],
-                labels={"analysisd_stats": "dbsync_messages_dispatched"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["other_events_decoded"],
-                labels={"analysisd_stats": "other_events_decoded"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["events_processed"],
-                labels={"analysisd_stats": "events_processed"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["events_received"],
-                labels={"analysisd_stats": "events_received"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["events_dropped"],
-                labels={"analysisd_stats": "events_dropped"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["alerts_written"],
-                labels={"analysisd_stats": "alerts_written"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["firewall_written"],
-                labels={"analysisd_stats": "firewall_written"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["fts_written"],
-                labels={"analysisd_stats": "fts_written"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["syscheck_queue_usage"],
-                labels={"analysisd_stats": "syscheck_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["syscheck_queue_size"],
-                labels={"analysisd_stats": "syscheck_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["syscollector_queue_usage"],
-                labels={"analysisd_stats": "syscollector_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["syscollector_queue_size"],
-                labels={"analysisd_stats": "syscollector_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["rootcheck_queue_usage"],
-                labels={"analysisd_stats": "rootcheck_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["rootcheck_queue_size"],
-                labels={"analysisd_stats": "rootcheck_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["sca_queue_usage"],
-                labels={"analysisd_stats": "sca_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["sca_queue_size"],
-                labels={"analysisd_stats": "sca_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["sca_queue_size"],
-                labels={"analysisd_stats": "sca_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["hostinfo_queue_usage"],
-                labels={"analysisd_stats": "hostinfo_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["hostinfo_queue_size"],
-                labels={"analysisd_stats": "hostinfo_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["winevt_queue_usage"],
-                labels={"analysisd_stats": "winevt_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["dbsync_queue_usage"],
-                labels={"analysisd_stats": "dbsync_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["dbsync_queue_size"],
-                labels={"analysisd_stats": "dbsync_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["upgrade_queue_usage"],
-                labels={"analysisd_stats": "upgrade_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["upgrade_queue_size"],
-                labels={"analysisd_stats": "upgrade_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["event_queue_usage"],
-                labels={"analysisd_stats": "event_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["event_queue_size"],
-                labels={"analysisd_stats": "event_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["rule_matching_queue_usage"],
-                labels={"analysisd_stats": "rule_matching_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["rule_matching_queue_size"],
-                labels={"analysisd_stats": "rule_matching_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["alerts_queue_usage"],
-                labels={"analysisd_stats": "alerts_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["alerts_queue_size"],
-                labels={"analysisd_stats": "alerts_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["firewall_queue_usage"],
-                labels={"analysisd_stats": "firewall_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["statistical_queue_usage"],
-                labels={"analysisd_stats": "statistical_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["statistical_queue_size"],
-                labels={"analysisd_stats": "statistical_queue_size"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["archives_queue_usage"],
-                labels={"analysisd_stats": "archives_queue_usage"},
-            )
-            metric.add_sample(
-                "analysisd_stats",
-                value=analysisd_stat["archives_queue_size"],
-                labels={"analysisd_stats": "archives_queue_size"},
+        self.cache = TTLCache(cache_ttls)
+        self.health = HealthCheck(
+            self.wazuh_connection.token_manager, max_age=ready_max_age, fresh=bool(background_polling)
+        )
+        self.flight = SingleFlight()
+        self.breakers = CircuitBreakers(
+            failures=circuit_failures, backoff=circuit_backoff, max_backoff=circuit_max_backoff
+        )
+        self.stale = set()
+        self.last_good = {}
+        self.guard = CardinalityGuard(
+            max_series=max_series_per_family, max_label_length=max_label_length, retention=series_retention
+        )
+        self.scrape_duration = Histogram(
+            "wazuh_exporter_scrape_duration_seconds",
+            "Duration of a complete Wazuh collection",
+            buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+            registry=None,
+        )
+        self.sections = [section for section in sections if all(r in self.endpoints for r in section[1])]
+        self.groups = {
+            group: tuple(name for name in names if name in self.endpoints) for group, names in endpoint_groups.items()
+        }
+        self.standalone = True
+        self.good_version = 0
+        self.warming = False
+        self.snapshot = None
+        if snapshot_path:
+            self.snapshot = SnapshotStore(
+                snapshot_path if target_name is None else f"{snapshot_path}.{target_name}", max_age=snapshot_max_age
             )
+            self.load_snapshot()
+        self.poller = None
+        if background_polling:
+            groups = {group: (poll_intervals[group], names) for group, names in self.groups.items()}
+            self.poller = Poller(groups, self.fetch)
+            # Scrapes are answered from the snapshot of the previous run until the first refresh
+            self.poller.results = dict(self.last_good)
+            self.poller.start()
+        elif self.warming:
+            threading.Thread(target=self.warm_up, name="wazuh-warm-up", daemon=True).start()
+        if not background_polling:
+            threading.Thread(target=self.start_up, name="wazuh-start-up", daemon=True).start()
+        if self.snapshot is not None:
+            threading.Thread(target=self.save_snapshots, name="wazuh-snapshot", daemon=True).start()
 
-        yield metric
-        metric = InfoMetricFamily(
-            "wazuh_validate_configuration",
-            "Return whether the Wazuh configuration is correct",
-        )
-        for validate in validate_configuration:
-            metric.add_metric(
-                labels=f'wazuh_{validate["name"]}',
-                value={
-                    "status": f'{validate["status"].strip()}',
-                    "node_name": f'{validate["name"]}',
-                },
+    def load_snapshot(self):
+        endpoints, age = self.snapshot.load()
+        self.last_good = {name: data for name, data in endpoints.items() if name in self.endpoints}
+        if self.last_good:
+            logger.info(f"Loaded {len(self.last_good)} endpoints from a {age:.0f}s old snapshot")
+            self.stale.update(self.last_good)
+            self.warming = True
+
+    def start_up(self):
+        """Log in until it succeeds, an exporter fetching on scrape is ready once logged in."""
+        backoff = 1.0
+        while True:
+            try:
+                self.wazuh_connection.login()
+                return
+            except Exception as error:
+                logger.warning(f"Startup login failed, retrying in {backoff:.0f}s: {error!r}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def warm_up(self):
+        """Fetch every endpoint once while scrapes are answered from the snapshot."""
+        try:
+            for _ in self.fetch(list(self.endpoints)):
+                pass
+        except Exception as error:
+            logger.warning(f"Warm up fetch failed: {error!r}")
+        finally:
+            self.warming = False
+
+    def save_snapshots(self):
+        saved_version = self.good_version
+        while True:
+            time.sleep(snapshot_interval)
+            if self.good_version == saved_version:
+                continue
+            saved_version = self.good_version
+            try:
+                self.snapshot.save(dict(self.last_good))
+            except Exception as error:
+                logger.warning(f"Failed to save snapshot {self.snapshot.path}: {error!r}")
+
+    def fetch_agents(self):
+        if self.agent_index is not None:
+            return agent_rows(self.agent_index.sync())
+        select = sorted({"id", "lastKeepAlive", *agent_metrics_labels})
+        return agent_rows(self.wazuh_connection.wazuh_iter_agents(select, page_size=agents_page_size))
+
+    def cluster_nodes(self):
+        """
+        :return:
+        names of the cluster nodes, empty when the cluster is not running, an error answer is raised and not cached
+        """
+        hit, nodes = self.cache.lookup("cluster_nodes")
+        if not hit:
+            nodes = [node["name"] for node in self.wazuh_connection.wazuh_get_cluster_nodes()]
+            self.cache.store("cluster_nodes", nodes)
+        return nodes
+
+    def fetch_daemon_stats(self):
+        """
+        Query the statistics of every daemon in one request per node
+        :return:
+        list of (node name, daemons), node name is None unless cluster node statistics are enabled
+        """
+        client = self.wazuh_connection
+        nodes = self.cluster_nodes() if cluster_node_stats else []
+        if not nodes:
+            return [(None, client.wazuh_get_daemons_stats(daemons))]
+        # The node requests keep the priority and the deadline of the daemon_stats endpoint
+        calls = {
+            name: with_deadline(with_priority(partial(client.wazuh_get_daemons_stats, daemons, name)))
+            for name in nodes
+        }
+        daemon_stats = []
+        for name, ok, data in gather(self.node_executor, calls, time_left(node_timeout, node_deadline_margin)):
+            if ok:
+                daemon_stats.append((name, data))
+            else:
+                logger.warning(f"Failed to fetch daemon statistics of node {name}: {data!r}")
+        return daemon_stats
+
+    def fetch_node_stats(self):
+        """
+        Query the statistics of every cluster node in parallel, a slow node only loses its own data
+        :return:
+        list of (node name, kind, items), node name is None when the cluster is disabled
+        """
+        client = self.wazuh_connection
+        nodes = self.cluster_nodes()
+        if not nodes:
+            calls = {
+                (None, "analysisd"): client.wazuh_get_analysisd_stats,
+                (None, "remoted"): client.wazuh_get_remote_stats,
+                (None, "stats"): client.wazuh_get_stats,
+            }
+        else:
+            calls = {}
+            for name in nodes:
+                calls[(name, "analysisd")] = partial(client.wazuh_get_node_analysisd_stats, name)
+                calls[(name, "remoted")] = partial(client.wazuh_get_node_remote_stats, name)
+                calls[(name, "stats")] = partial(client.wazuh_get_node_stats, name)
+        if daemon_stats_enabled:
+            calls = {key: call for key, call in calls.items() if key[1] == "stats"}
+        calls = {key: with_deadline(with_priority(call)) for key, call in calls.items()}
+        node_stats = []
+        # The nodes that answered are returned before the endpoint deadline, the late ones only lose their own data
+        timeout = time_left(node_timeout, node_deadline_margin)
+        for (name, kind), ok, data in gather(self.node_executor, calls, timeout):
+            if ok:
+                node_stats.append((name, kind, data))
+            else:
+                logger.warning(f"Failed to fetch {kind} statistics of node {name}: {data!r}")
+        return node_stats
+
+    def fetch(self, names, timeout=None):
+        """
+        Query the given endpoints concurrently, each one has EXPORTER_ENDPOINT_TIMEOUT seconds from its start
+        :param timeout: seconds the whole fetch, login included, may take, no limit but the endpoint timeouts when None
+        :return:
+        generator of (endpoint name, data) in completion order, data is None when the call failed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        missing = []
+        for name in names:
+            hit, data = self.cache.lookup(name)
+            if hit:
+                yield name, data
+            else:
+                missing.append(name)
+        calls = {}
+        for name in missing:
+            if self.breakers.allow(name):
+                call = with_priority(self.endpoints[name], endpoint_priorities.get(name))
+                calls[name] = with_timeout(call, endpoint_timeout, deadline)
+            else:
+                self.stale.add(name)
+                yield name, None
+        if not calls:
+            return
+        # The token is requested once for all the calls, the endpoint timeouts start once it is there
+        login = {"login": with_timeout(self.wazuh_connection.login, endpoint_timeout, deadline)}
+        for _, ok, error in gather(self.executor, login, seconds_left(deadline), endpoint_timeout):
+            if not ok:
+                logger.warning(f"Failed to log in to the Wazuh API: {error!r}")
+                for name in calls:
+                    self.breakers.failure(name)
+                    self.stale.add(name)
+                    yield name, None
+                return
+        for name, ok, data in gather(self.executor, calls, seconds_left(deadline), endpoint_timeout):
+            if ok:
+                self.breakers.success(name)
+                self.stale.discard(name)
+                self.health.record_success()
+                self.cache.store(name, data)
+                self.last_good[name] = data
+                self.good_version += 1
+                yield name, data
+            else:
+                self.breakers.failure(name)
+                self.stale.add(name)
+                logger.warning(f"Failed to fetch Wazuh endpoint {name}: {data!r}")
+                yield name, None
+
+    def version(self):
+        """Changes whenever the background polling refreshed data, None without background polling."""
+        return None if self.poller is None else self.poller.generation
+
+    def collect(self):
+        # Scrapes arriving while a collection runs share its result instead of querying the API again
+        return iter(self.flight.do(scrape_key(), self.timed_collect))
+
+    def timed_collect(self):
+        with self.scrape_duration.time():
+            # Every family goes through the cardinality guard, a noisy manager can not flood Prometheus
+            return list(self.guard.apply(self.collect_families()))
+
+    def collect_families(self):
+        started = time.monotonic()
+        outcomes = {}
+        selected = current_collectors()
+        pending = [section for section in self.sections if selected is None or section[0] in selected]
+        if self.poller is not None:
+            yield from build_ready(self.poller.results, pending, outcomes)
+            metric = GaugeMetricFamily(
+                "wazuh_exporter_snapshot_age_seconds",
+                "Seconds since the endpoint group was last refreshed from the Wazuh API",
+                labels=["group"],
             )
+            for group in self.groups:
+                metric.add_metric(labels=[group], value=self.poller.age(group))
+            yield metric
+        elif self.warming:
+            yield from build_ready(dict(self.last_good), pending, outcomes)
+        else:
+            # Endpoints still running when the scrape budget is spent are abandoned, the sections
+            # built by then are returned instead of failing the whole scrape
+            # Only the endpoints of the selected collectors are fetched
+            names = [name for name in self.endpoints if any(name in section[1] for section in pending)]
+            results = {}
+            for name, data in self.fetch(names, scrape_budget()):
+                # A failed endpoint or one with an open circuit is served from its last good data
+                results[name] = self.last_good.get(name) if data is None else data
+                yield from build_ready(results, pending, outcomes)
+        for name, _, _ in pending:
+            outcomes[name] = (False, time.monotonic())
+        success = GaugeMetricFamily(
+            "wazuh_exporter_collector_success",
+            "1 when the collector built its metrics during the last collection",
+            labels=["collector"],
+        )
+        duration = GaugeMetricFamily(
+            "wazuh_exporter_collector_duration_seconds",
+            "Seconds from the start of the last collection until the collector was built or given up",
+            labels=["collector"],
+        )
+        for name, (ok, finished) in sorted(outcomes.items()):
+            success.add_metric(labels=[name], value=1 if ok else 0)
+            duration.add_metric(labels=[name], value=finished - started)
+        yield success
+        yield duration
+        yield from self.cache.collect()
+        yield from self.wazuh_connection.metrics.collect()
+        if self.wazuh_connection.limiter is not None:
+            yield from self.wazuh_connection.limiter.collect()
+        if self.agent_index is not None:
+            yield from self.agent_index.collect()
+        yield from self.scrape_duration.collect()
+        yield from self.breakers.collect()
+        metric = GaugeMetricFamily(
+            "wazuh_exporter_endpoint_stale",
+            "1 when the Wazuh endpoint data is the last good data because the last call failed or was skipped",
+            labels=["endpoint"],
+        )
+        for name in self.endpoints:
+            metric.add_metric(labels=[name], value=1 if name in self.stale else 0)
         yield metric
+        yield from self.guard.collect()
+        if self.standalone:
+            yield from missing_fields.collect()
+
+
+class MultiTargetCollector:
+    """
+    Collect several Wazuh managers concurrently, every sample is labelled with its target name.
+
+    The targets share the endpoint and node pools, so the number of concurrent Wazuh API
+    requests is bounded by EXPORTER_FETCH_WORKERS whatever the number of targets.
+    """
+
+    def __init__(self, targets):
+        self.executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="wazuh-fetch")
+        self.node_executor = None
+        if cluster_node_stats or daemon_stats_enabled:
+            self.node_executor = ThreadPoolExecutor(max_workers=node_fetch_workers, thread_name_prefix="wazuh-node")
+        # Target collections only wait on the shared pools, they must not run in them to avoid a deadlock
+        self.target_executor = ThreadPoolExecutor(max_workers=target_workers, thread_name_prefix="wazuh-target")
+        self.collectors = {}
+        for target in targets:
+            collector = WazuhCollector(target, self.executor, self.node_executor)
+            collector.standalone = False
+            self.collectors[target["name"]] = collector
+        self.health = TargetsHealth({name: collector.health for name, collector in self.collectors.items()})
+        self.flight = SingleFlight()
+
+    def version(self):
+        return tuple(collector.version() for collector in self.collectors.values())
+
+    def collect(self):
+        return iter(self.flight.do(scrape_key(), self.collect_targets))
+
+    def collect_targets(self):
+        # The targets are collected by other threads, hand them the scrape context of this request
+        calls = {name: with_scrape_context(collector.timed_collect) for name, collector in self.collectors.items()}
+        results = []
+        # Half of the offset is left to the targets to build the families fetched within the budget
+        for name, ok, data in gather(self.target_executor, calls, scrape_budget() + scrape_timeout_offset / 2):
+            if ok:
+                results.append((name, data))
+            else:
+                logger.warning(f"Failed to collect target {name}: {data!r}")
+        families = merge_families(results)
+        families.extend(missing_fields.collect())
+        return families
 
 
 if __name__ == "__main__":
     logger.info("Starting Wazuh prometheus exporter")
-    start_http_server(int(listen_port))
-    REGISTRY.register(WazuhCollector())
+    if targets_file:
+        targets = load_targets(
+            targets_file, {"protocol": protocol, "port": port or None, "user": user, "password": password}
+        )
+        collector = MultiTargetCollector(targets)
+        target_registries = {}
+        for name, target_collector in collector.collectors.items():
+            target_registries[name] = CollectorRegistry()
+            target_registries[name].register(target_collector)
+    else:
+        collector = WazuhCollector()
+        target_registries = None
+    exposition = None
+    if prerender:
+        exposition = ExpositionCache(REGISTRY, collector.version, max_age=prerender_max_age)
+    # Every target runs the same collectors
+    enabled = next(iter(collector.collectors.values())) if targets_file else collector
+    collector_names = [name for name, _, _ in enabled.sections]
+    if async_server:
+        responder = make_responder(REGISTRY, collector.health, target_registries, exposition, collector_names)
+        start_async_server(
+            int(listen_port), responder, workers=http_workers, probes=make_probes(collector.health)
+        )
+    else:
+        app = make_app(REGISTRY, collector.health, target_registries, exposition, collector_names)
+        start_server(int(listen_port), app)
+    REGISTRY.register(collector)
 
     while True:
         time.sleep(1)
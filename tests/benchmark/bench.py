@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+Benchmark WazuhCollector.collect against the stub Wazuh API.
+
+Every scenario starts a stub for one fleet size and runs the exporter collector in a fresh
+process, so the environment read by main.py at import time and the memory measures belong
+to that scenario only. Reported per scenario:
+scrape latency (median, p95, max), exporter CPU seconds per scrape, exporter RSS,
+Wazuh API calls per scrape and exposition size.
+
+    python tests/benchmark/bench.py --agents 1000,10000,100000 --latency 0.02 --env EXPORTER_AGENT_METRICS=1
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess  # nosec
+import sys
+import time
+from pathlib import Path
+from urllib.request import urlopen
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parents[1]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def stub_calls(port):
+    with urlopen(f"http://127.0.0.1:{port}/_stats") as response:  # nosec
+        return json.load(response)
+
+
+def rss_bytes():
+    with open("/proc/self/statm", encoding="utf-8") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def worker(scrapes, stub_port):
+    """Run in the scenario process: import the exporter, scrape it and print the measures as JSON."""
+    sys.path.insert(0, str(ROOT))
+    from prometheus_client import CollectorRegistry, generate_latest
+
+    import main
+
+    registry = CollectorRegistry()
+    collector = main.WazuhCollector()
+    # The first collection logs in and fills the caches, it is measured apart
+    started = time.perf_counter()
+    registry.register(collector)
+    output = generate_latest(registry)
+    first = time.perf_counter() - started
+    if collector.poller is not None:
+        # Let the background polling run once before measuring the scrapes it answers
+        time.sleep(1)
+    calls_before = sum(stub_calls(stub_port).values())
+    cpu_before = time.process_time()
+    latencies = []
+    for _ in range(scrapes):
+        started = time.perf_counter()
+        output = generate_latest(registry)
+        latencies.append(time.perf_counter() - started)
+    cpu = time.process_time() - cpu_before
+    calls = sum(stub_calls(stub_port).values()) - calls_before
+    print(
+        json.dumps(
+            {
+                "first_scrape_seconds": first,
+                "scrape_p50_seconds": percentile(latencies, 0.5),
+                "scrape_p95_seconds": percentile(latencies, 0.95),
+                "scrape_max_seconds": max(latencies),
+                "cpu_seconds_per_scrape": cpu / scrapes,
+                "rss_mb": rss_bytes() / 2**20,
+                "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "api_calls_per_scrape": calls / scrapes,
+                "exposition_kb": len(output) / 1024,
+            }
+        )
+    )
+
+
+def wait_for(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            stub_calls(port)
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Stub Wazuh API did not start on port {port}")
+
+
+def scenario(agents, latency, scrapes, extra_env):
+    port = free_port()
+    stub = subprocess.Popen(  # nosec
+        [sys.executable, str(HERE / "stub_wazuh.py"), "--port", str(port), "--agents", str(agents), "--latency", str(latency)]
+    )
+    try:
+        wait_for(port)
+        env = dict(os.environ)
+        env.update(
+            {
+                "WAZUH_PROTOCOL": "http",
+                "WAZUH_API_HOST": "127.0.0.1",
+                "WAZUH_API_PORT": str(port),
+                "WAZUH_API_USERNAME": "wazuh-wui",
+                "WAZUH_API_PASSWORD": "wazuh-wui",
+            }
+        )
+        env.update(extra_env)
+        result = subprocess.run(  # nosec
+            [sys.executable, __file__, "--worker", "--scrapes", str(scrapes), "--stub-port", str(port)],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        return json.loads(result.stdout.decode().strip().splitlines()[-1])
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Wazuh exporter collector against a stub Wazuh API")
+    parser.add_argument("--agents", default="1000,10000,100000", help="comma separated fleet sizes")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every stub answer")
+    parser.add_argument("--scrapes", type=int, default=10, help="measured scrapes per scenario")
+    parser.add_argument("--env", action="append", default=[], help="exporter variable KEY=VALUE, repeatable")
+    parser.add_argument("--json", action="store_true", help="print one JSON document per scenario")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--stub-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.scrapes, args.stub_port)
+        return
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    columns = (
+        ("agents", "agents", "{:>8}"),
+        ("first_scrape_seconds", "first_s", "{:>9.3f}"),
+        ("scrape_p50_seconds", "p50_s", "{:>9.3f}"),
+        ("scrape_p95_seconds", "p95_s", "{:>9.3f}"),
+        ("scrape_max_seconds", "max_s", "{:>9.3f}"),
+        ("cpu_seconds_per_scrape", "cpu_s", "{:>9.4f}"),
+        ("rss_mb", "rss_mb", "{:>9.1f}"),
+        ("max_rss_mb", "maxrss_mb", "{:>9.1f}"),
+        ("api_calls_per_scrape", "calls", "{:>9.1f}"),
+        ("exposition_kb", "size_kb", "{:>9.1f}"),
+    )
+    if not args.json:
+        print(f"latency {args.latency}s, {args.scrapes} scrapes, env {extra_env or '-'}")
+        print(" ".join(header.rjust(len(fmt.format(0))) for _, header, fmt in columns))
+    for agents in [int(agents) for agents in args.agents.split(",")]:
+        result = {"agents": agents, **scenario(agents, args.latency, args.scrapes, extra_env)}
+        if args.json:
+            print(json.dumps({"latency": args.latency, "env": extra_env, **result}))
+        else:
+            print(" ".join(fmt.format(result[name]) for name, _, fmt in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+"""
+Stub Wazuh API replaying the JSON fixtures of tests/benchmark/fixtures.
+
+The agent list is generated from fixtures/agent.json for the requested fleet size and
+supports the paging, select and filters used by the exporter, like the log entries of
+fixtures/logs.json. Every answer can be delayed
+to simulate a loaded manager. GET /_stats returns the number of calls per path.
+"""
+import argparse
+import base64
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = Path(__file__).parent / "fixtures"
+PLACEHOLDER = re.compile(r"^\{(\w+)\}$")
+INACTIVE_EVERY = 20
+TIMESTAMP_FILTER = re.compile(r"^timestamp(>=|<=|>|<|=)(.+)$")
+TIMESTAMP_OPERATORS = {
+    ">=": lambda value, bound: value >= bound,
+    "<=": lambda value, bound: value <= bound,
+    ">": lambda value, bound: value > bound,
+    "<": lambda value, bound: value < bound,
+    "=": lambda value, bound: value == bound,
+}
+
+# Request path to fixture name, checked in order
+ROUTES = (
+    (re.compile(r"^/$"), "api_info"),
+    (re.compile(r"^/security/user/authenticate$"), "authenticate"),
+    (re.compile(r"^/overview/agents$"), "agents_overview"),
+    (re.compile(r"^/manager/stats/hourly$"), "hourly_stats"),
+    (re.compile(r"^/(manager|cluster/[^/]+)/stats$"), "manager_stats"),
+    (re.compile(r"^/(manager|cluster/[^/]+)/stats/remoted$"), "remoted_stats"),
+    (re.compile(r"^/(manager|cluster/[^/]+)/stats/analysisd$"), "analysisd_stats"),
+    (re.compile(r"^/(manager|cluster/[^/]+)/daemons/stats$"), "daemons_stats"),
+    (re.compile(r"^/manager/logs$"), "logs"),
+    (re.compile(r"^/manager/configuration/validation$"), "configuration_validation"),
+    (re.compile(r"^/cluster/healthcheck$"), "cluster_healthcheck"),
+    (re.compile(r"^/cluster/nodes$"), "cluster_nodes"),
+)
+
+
+def fill(value, variables):
+    """Replace the {name} placeholders of a fixture, a value made of a single placeholder keeps its type."""
+    if isinstance(value, dict):
+        return {key: fill(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, variables) for item in value]
+    if isinstance(value, str):
+        match = PLACEHOLDER.match(value)
+        if match and match.group(1) in variables:
+            return variables[match.group(1)]
+        return value.format(**variables) if "{" in value else value
+    return value
+
+
+def token():
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+
+    return f'{encode({"alg": "HS256", "typ": "JWT"})}.{encode({"iat": int(time.time()), "exp": int(time.time()) + 900})}.stub'
+
+
+def window(items, query):
+    """Apply the offset and limit parameters, 500 items by default like the Wazuh API"""
+    offset = int(query.get("offset", ["0"])[0])
+    limit = int(query.get("limit", ["500"])[0])
+    return items[offset:offset + limit]
+
+
+def affected_items(items, total):
+    return {
+        "data": {"affected_items": items, "total_affected_items": total, "total_failed_items": 0, "failed_items": []},
+        "error": 0,
+    }
+
+
+class Fleet:
+    """Agents generated on demand, agent i is inactive every INACTIVE_EVERY agents."""
+
+    def __init__(self, size):
+        self.size = size
+        self.template = json.loads((FIXTURES / "agent.json").read_text())
+        self.inactive = (size + INACTIVE_EVERY - 1) // INACTIVE_EVERY
+
+    def agent(self, index):
+        return fill(
+            self.template,
+            {
+                "id": f"{index:03d}",
+                "index": index,
+                "ip": f"{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+                "status": "disconnected" if index % INACTIVE_EVERY == 0 else "active",
+                "node": "wazuh-master" if index % 2 == 0 else "wazuh-worker",
+            },
+        )
+
+    def select(self, query):
+        """
+        :return:
+        (indexes of the matching agents, total)
+        """
+        if "q" in query:
+            # Every agent was added long ago, no dateAdd> delta ever matches
+            return [], 0
+        if "older_than" in query:
+            # Every agent kept alive recently
+            return [], 0
+        if "agents_list" in query:
+            indexes = [int(agent_id) for agent_id in query["agents_list"][0].split(",") if agent_id]
+            indexes = [index for index in indexes if index < self.size]
+            return indexes, len(indexes)
+        if "status" in query:
+            indexes = range(0, self.size, INACTIVE_EVERY)
+            if "active" in query["status"][0].split(","):
+                indexes = range(self.size)
+            return indexes, len(indexes)
+        return range(self.size), self.size
+
+    def page(self, query):
+        indexes, total = self.select(query)
+        fields = query["select"][0].split(",") if "select" in query else None
+        agents = []
+        for index in window(indexes, query):
+            agent = self.agent(index)
+            if fields:
+                agent = {key: agent[key] for key in fields if key in agent}
+            agents.append(agent)
+        return affected_items(agents, total)
+
+
+class Logs:
+    """Log entries of fixtures/logs.json, supporting the paging, sort and timestamp filter used by the exporter."""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def select(self, query):
+        """
+        :return:
+        matching entries in the requested order
+        """
+        entries = self.entries
+        if "q" in query:
+            match = TIMESTAMP_FILTER.match(query["q"][0])
+            if match is None:
+                raise ValueError(f"Unsupported log filter {query['q'][0]}")
+            operator, bound = match.groups()
+            entries = [entry for entry in entries if TIMESTAMP_OPERATORS[operator](entry["timestamp"], bound)]
+        sort = query.get("sort", [""])[0]
+        if sort.lstrip("+-") == "timestamp":
+            entries = sorted(entries, key=lambda entry: entry["timestamp"], reverse=sort.startswith("-"))
+        return entries
+
+    def page(self, query):
+        entries = self.select(query)
+        return affected_items(window(entries, query), len(entries))
+
+
+class StubWazuh:
+    def __init__(self, agents, latency=0.0):
+        self.fleet = Fleet(agents)
+        self.latency = latency
+        self.variables = {
+            "agents": agents,
+            "agents_half": agents // 2,
+            "agents_active": agents - self.fleet.inactive,
+            "agents_disconnected": self.fleet.inactive,
+        }
+        # Static fixtures are encoded once, like the recorded answers they stand for
+        self.bodies = {}
+        for _, name in ROUTES:
+            if name != "authenticate":
+                fixture = json.loads((FIXTURES / f"{name}.json").read_text())
+                self.bodies[name] = json.dumps(fill(fixture, self.variables)).encode()
+        self.logs = Logs(json.loads(self.bodies["logs"])["data"]["affected_items"])
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def answer(self, path, query):
+        """
+        :return:
+        (status code, body)
+        """
+        if path == "/agents":
+            return 200, json.dumps(self.fleet.page(query)).encode()
+        if path == "/manager/logs":
+            try:
+                return 200, json.dumps(self.logs.page(query)).encode()
+            except ValueError as error:
+                return 400, json.dumps({"title": "Bad Request", "detail": str(error)}).encode()
+        for pattern, name in ROUTES:
+            if pattern.match(path):
+                if name == "authenticate":
+                    return 200, json.dumps({"data": {"token": token()}, "error": 0}).encode()
+                return 200, self.bodies[name]
+        return 404, json.dumps({"title": "Not Found", "detail": f"{path} is not stubbed"}).encode()
+
+    def count(self, path):
+        with self.lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # skipcq: PYL-W0622
+                """Do not log every request."""
+
+            def do_GET(self):  # skipcq: PYL-R0201
+                url = urlsplit(self.path)
+                if url.path == "/_stats":
+                    with stub.lock:
+                        code, body = 200, json.dumps(stub.calls).encode()
+                else:
+                    stub.count(url.path)
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    code, body = stub.answer(url.path, parse_qs(url.query))
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_POST = do_GET
+
+        return Handler
+
+
+def serve(port, agents, latency=0.0, addr="127.0.0.1"):
+    stub = StubWazuh(agents, latency)
+    httpd = ThreadingHTTPServer((addr, port), stub.handler())
+    httpd.daemon_threads = True
+    return httpd
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=55000)
+    parser.add_argument("--agents", type=int, default=1000, help="fleet size")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every answer")
+    args = parser.parse_args()
+    serve(args.port, args.agents, args.latency).serve_forever()
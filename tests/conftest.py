@@ -0,0 +1,155 @@
+import base64
+import importlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import wazuh
+
+
+def make_token(lifetime=900):
+    """Unsigned JWT expiring in lifetime seconds, the exporter only reads its claims"""
+    now = int(time.time())
+    claims = base64.urlsafe_b64encode(json.dumps({"iat": now, "exp": now + lifetime}).encode()).decode().rstrip("=")
+    return f"eyJhbGciOiJIUzI1NiJ9.{claims}.signature"
+
+
+class FakeResponse:
+    def __init__(self, status_code, answer):
+        self.status_code = status_code
+        self.content = answer if isinstance(answer, bytes) else json.dumps(answer).encode()
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """
+    Answer the GET requests of a Wazuh client from canned answers by path.
+    A path answers its queued (status, answer) pairs in turn, the last one is repeated.
+    """
+
+    def __init__(self):
+        self.answers = {"/security/user/authenticate": [(200, {"data": {"token": make_token()}})]}
+        self.requests = []
+
+    def answer(self, path, *answers):
+        self.answers[path] = list(answers)
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        path = "/" + url.split("/", 3)[3].split("?")[0]
+        self.requests.append((path, headers))
+        answers = self.answers[path]
+        status_code, answer = answers.pop(0) if len(answers) > 1 else answers[0]
+        return FakeResponse(status_code, answer)
+
+    def paths(self):
+        return [path for path, _ in self.requests]
+
+
+@pytest.fixture(scope="session")
+def exporter():
+    """The exporter module, imported with the connection settings it requires"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("WAZUH_API_HOST", "manager")
+        monkeypatch.setenv("WAZUH_API_PORT", "55000")
+        monkeypatch.setenv("WAZUH_API_USERNAME", "wazuh")
+        monkeypatch.setenv("WAZUH_API_PASSWORD", "wazuh")
+        return importlib.import_module("main")
+
+
+class Clock:
+    """Monotonic clock moved by hand, stands for the time module of the modules it is installed in"""
+
+    def __init__(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def install(self, module):
+        self.monkeypatch.setattr(module, "time", self)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return Clock(monkeypatch)
+
+
+class FakeClient:
+    """
+    Answer the agent and log iterations of a Wazuh client from lists of agents and log entries,
+    supporting the parameters used by AgentIndex and LogCursor.
+    """
+
+    def __init__(self):
+        self.agents = []
+        self.logs = []
+        self.queries = []
+
+    def select(self, params):
+        for agent in self.agents:
+            if "q" in params:
+                field, bound = params["q"].split(">")
+                if agent.get(field, "")[:19] <= bound:
+                    continue
+            if "status" in params and agent["status"] not in params["status"].split(","):
+                continue
+            if "older_than" in params and agent["lastKeepAlive"] >= ago(int(params["older_than"].rstrip("s"))):
+                continue
+            if "agents_list" in params and agent["id"] not in params["agents_list"].split(","):
+                continue
+            yield agent
+
+    def wazuh_iter_agents(self, select, page_size=500, params=None):
+        params = params or {}
+        self.queries.append(params)
+        fields = params.get("select", ",".join(select)).split(",")
+        for agent in self.select(params):
+            yield {key: agent[key] for key in fields if key in agent}
+
+    def wazuh_count_agents(self, params=None):
+        return sum(1 for _ in self.select(params or {}))
+
+    def wazuh_iter_logs(self, params):
+        self.queries.append(params)
+        logs = sorted(self.logs, key=lambda log: log["timestamp"], reverse=params["sort"] == "-timestamp")
+        if "q" in params:
+            since = params["q"][len("timestamp>="):]
+            logs = [log for log in logs if log["timestamp"] >= since]
+        return iter(logs[params["offset"]:params["offset"] + params["limit"]])
+
+
+@pytest.fixture
+def fake_client():
+    return FakeClient()
+
+
+@pytest.fixture
+def session():
+    return FakeSession()
+
+
+@pytest.fixture
+def client(session):
+    client = wazuh.Wazuh(
+        "https", "manager", 55000, "security/user/authenticate", "wazuh", "wazuh", retry_backoff=0
+    )
+    client.session = session
+    return client
+
+
+def items(affected_items):
+    return {"data": {"affected_items": affected_items, "total_affected_items": len(affected_items)}, "error": 0}
+
+
+def ago(seconds):
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%S+00:00")
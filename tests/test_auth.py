@@ -0,0 +1,77 @@
+import pytest
+
+from conftest import items, make_token
+from wazuh import auth
+from wazuh.auth import RENEW_RETRY_INTERVAL, TokenManager, token_lifetime
+
+
+class Authenticate:
+    """Return the queued tokens in turn, raise the queued exceptions"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def clock(clock):
+    clock.install(auth)
+    return clock
+
+
+def test_token_lifetime():
+    assert token_lifetime(make_token(600)) == 600
+    assert token_lifetime("not a token") is None
+
+
+def test_renewed_ahead_of_expiry(clock):
+    first, second = make_token(300), make_token(301)
+    authenticate = Authenticate(first, second)
+    tokens = TokenManager(authenticate, renew_before=60)
+    assert tokens.get() == first
+    clock.now += 239
+    assert tokens.get() == first and authenticate.calls == 1
+    clock.now += 1
+    assert tokens.get() == second and authenticate.calls == 2
+
+
+def test_failed_renewal_keeps_the_valid_token(clock):
+    first, second = make_token(300), make_token(301)
+    authenticate = Authenticate(first, ConnectionError("manager down"), second)
+    tokens = TokenManager(authenticate, renew_before=60)
+    tokens.get()
+    clock.now += 250
+    assert tokens.get() == first and tokens.error is None
+    # Not retried on every request
+    assert tokens.get() == first and authenticate.calls == 2
+    clock.now += RENEW_RETRY_INTERVAL
+    assert tokens.get() == second and authenticate.calls == 3
+
+
+def test_failed_login_without_a_valid_token_raises(clock):
+    authenticate = Authenticate(make_token(300), ConnectionError("manager down"))
+    tokens = TokenManager(authenticate, renew_before=60)
+    tokens.get()
+    clock.now += 300
+    with pytest.raises(ConnectionError):
+        tokens.get()
+    assert not tokens.valid() and isinstance(tokens.error, ConnectionError)
+
+
+def test_relogin_after_a_rejected_token(client, session):
+    first, second = make_token(900), make_token(901)
+    session.answer("/security/user/authenticate", (200, {"data": {"token": first}}), (200, {"data": {"token": second}}))
+    session.answer("/agents", (401, {"title": "Unauthorized", "detail": "Invalid token", "error": 6}), (200, items([])))
+    assert client.get("agents") == (200, items([]))
+    assert session.paths() == ["/security/user/authenticate", "/agents", "/security/user/authenticate", "/agents"]
+    assert [headers["Authorization"] for path, headers in session.requests if path == "/agents"] == [
+        f"Bearer {first}",
+        f"Bearer {second}",
+    ]
@@ -0,0 +1,73 @@
+import pytest
+
+from wazuh import breaker
+from wazuh.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    clock.install(breaker)
+    monkeypatch.setattr(breaker.random, "uniform", lambda low, high: 1.0)
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    circuit = CircuitBreaker(failures=3, backoff=30)
+    assert not circuit.failure()
+    assert not circuit.failure()
+    circuit.success()
+    assert not circuit.failure()
+    assert not circuit.failure()
+    assert circuit.state == CLOSED and circuit.allow()
+    assert circuit.failure()
+    assert circuit.state == OPEN
+    assert not circuit.allow()
+
+
+def test_half_open_probe_closes(clock):
+    circuit = CircuitBreaker(failures=1, backoff=30)
+    circuit.failure()
+    clock.now += 29
+    assert not circuit.allow()
+    clock.now += 1
+    assert circuit.allow()
+    assert circuit.state == HALF_OPEN
+    # Only one probe is let through
+    assert not circuit.allow()
+    circuit.success()
+    assert circuit.state == CLOSED and circuit.failures == 0 and circuit.backoff == 30
+    assert circuit.allow()
+
+
+def test_half_open_failure_doubles_backoff(clock):
+    circuit = CircuitBreaker(failures=1, backoff=30, max_backoff=100)
+    circuit.failure()
+    for backoff in (60, 100, 100):
+        clock.now += circuit.backoff
+        assert circuit.allow()
+        assert circuit.failure()
+        assert circuit.state == OPEN and circuit.backoff == backoff
+        assert circuit.open_until == clock.now + backoff
+    circuit.failure()
+    # A failure reported while open does not extend it
+    assert circuit.open_until == clock.now + 100
+
+
+def test_breakers_count_rejected_and_opened(clock):
+    breakers = CircuitBreakers(failures=2, backoff=30)
+    breakers.failure("logs")
+    breakers.failure("logs")
+    assert not breakers.allow("logs")
+    assert breakers.allow("agents")
+    assert breakers.rejected.labels("logs")._value.get() == 1
+    assert breakers.opened.labels("logs")._value.get() == 1
+    states = {sample.labels["endpoint"]: sample.value for sample in next(breakers.collect()).samples}
+    assert states == {"agents": 0, "logs": 1}
+
+
+def test_breakers_disabled(clock):
+    breakers = CircuitBreakers(failures=0)
+    for _ in range(10):
+        breakers.failure("logs")
+    assert breakers.allow("logs")
+    assert breakers.breakers == {}
@@ -0,0 +1,44 @@
+import pytest
+
+from wazuh import cache
+from wazuh.cache import TTLCache
+
+
+@pytest.fixture
+def clock(clock):
+    clock.install(cache)
+    return clock
+
+
+def requests(ttl_cache, name, result):
+    return ttl_cache.requests.labels(name, result)._value.get()
+
+
+def test_hit_until_the_ttl_expires(clock):
+    ttl_cache = TTLCache({"agents": 60})
+    assert ttl_cache.lookup("agents") == (False, None)
+    ttl_cache.store("agents", ["001"])
+    clock.now += 59
+    assert ttl_cache.lookup("agents") == (True, ["001"])
+    clock.now += 1
+    assert ttl_cache.lookup("agents") == (False, None)
+    assert requests(ttl_cache, "agents", "hit") == 1 and requests(ttl_cache, "agents", "miss") == 2
+
+
+def test_endpoints_without_ttl_are_not_cached(clock):
+    ttl_cache = TTLCache({"agents": 0})
+    ttl_cache.store("agents", ["001"])
+    ttl_cache.store("api_info", {"api_version": "4.8.0"})
+    assert ttl_cache.lookup("agents") == (False, None)
+    assert ttl_cache.lookup("api_info") == (False, None)
+    assert ttl_cache.entries == {}
+
+
+def test_age(clock):
+    ttl_cache = TTLCache({"agents": 60, "rules": 600})
+    ttl_cache.store("rules", [])
+    clock.now += 30
+    ttl_cache.store("agents", [])
+    clock.now += 10
+    age = next(metric for metric in ttl_cache.collect() if metric.name == "wazuh_exporter_cache_age_seconds")
+    assert [(sample.labels["endpoint"], sample.value) for sample in age.samples] == [("agents", 10), ("rules", 40)]
@@ -0,0 +1,57 @@
+from prometheus_client.core import GaugeMetricFamily, HistogramMetricFamily, SummaryMetricFamily
+
+from wazuh import cardinality
+from wazuh.cardinality import CardinalityGuard
+
+
+def gauge(*agents):
+    family = GaugeMetricFamily("wazuh_agent_status", "Agent status", labels=["agent"])
+    for agent in agents:
+        family.add_metric([agent], 1)
+    return family
+
+
+def series(family, label):
+    return sorted({sample.labels[label] for sample in family.samples})
+
+
+def dropped(guard, family):
+    return guard.dropped.labels(family)._value.get()
+
+
+def test_histogram_and_summary_series_are_kept_whole():
+    histogram = HistogramMetricFamily("wazuh_rule_duration", "Rule duration", labels=["rule"])
+    summary = SummaryMetricFamily("wazuh_rule_latency", "Rule latency", labels=["rule"])
+    for rule in ["1", "2", "3"]:
+        histogram.add_metric([rule], buckets=[("0.1", 1), ("1.0", 2), ("+Inf", 3)], sum_value=1.5)
+        summary.add_metric([rule], count_value=3, sum_value=1.5)
+    guard = CardinalityGuard(max_series=2)
+    histogram, summary = guard.apply([histogram, summary])
+
+    # Three buckets, a sum and a count per series
+    assert len(histogram.samples) == 10 and series(histogram, "rule") == ["1", "2"]
+    assert len(summary.samples) == 4 and series(summary, "rule") == ["1", "2"]
+    assert dropped(guard, "wazuh_rule_duration") == dropped(guard, "wazuh_rule_latency") == 1
+
+
+def test_label_values_changing_across_scrapes(clock):
+    clock.install(cardinality)
+    guard = CardinalityGuard(max_series=3, retention=600)
+    assert series(next(guard.apply([gauge("a", "b")])), "agent") == ["a", "b"]
+    # New agents only take the free place, the series already exported stay
+    assert series(next(guard.apply([gauge("c", "d", "e", "a")])), "agent") == ["a", "c"]
+    assert dropped(guard, "wazuh_agent_status") == 2
+    clock.now += 300
+    assert series(next(guard.apply([gauge("d", "e", "f", "c", "a")])), "agent") == ["a", "c"]
+    # b is not exported anymore and its place is freed after the retention
+    clock.now += 301
+    assert series(next(guard.apply([gauge("d", "e", "a", "c")])), "agent") == ["a", "c", "d"]
+    assert dropped(guard, "wazuh_agent_status") == 6
+
+
+def test_long_label_values_are_truncated_and_distinct():
+    guard = CardinalityGuard(max_label_length=16)
+    family = next(guard.apply([gauge("x" * 40 + "1", "x" * 40 + "2", "short")]))
+    values = series(family, "agent")
+    assert len(set(values)) == 3 and all(len(value) <= 16 for value in values)
+    assert guard.truncated.labels("wazuh_agent_status")._value.get() == 2
@@ -0,0 +1,28 @@
+import pytest
+import requests
+
+from conftest import items
+
+NOT_RUNNING = {"title": "Wazuh Cluster Error", "detail": "Cluster is not running", "error": 3013}
+
+
+def test_cluster_nodes(client, session):
+    session.answer("/cluster/nodes", (200, items([{"name": "master"}, {"name": "worker"}])))
+    assert client.wazuh_get_cluster_nodes() == [{"name": "master"}, {"name": "worker"}]
+
+
+def test_cluster_not_running_has_no_nodes(client, session):
+    session.answer("/cluster/nodes", (400, NOT_RUNNING))
+    session.answer("/cluster/healthcheck", (400, NOT_RUNNING))
+    assert client.wazuh_get_cluster_nodes() == []
+    assert client.wazuh_get_nodes_healtchecks() == []
+
+
+@pytest.mark.parametrize("status_code", [403, 429, 500, 503])
+def test_cluster_errors_raise(client, session, status_code):
+    session.answer("/cluster/nodes", (status_code, {"title": "Error", "detail": "boom", "error": 1000}))
+    session.answer("/cluster/healthcheck", (status_code, {"title": "Error", "detail": "boom", "error": 1000}))
+    with pytest.raises(requests.HTTPError):
+        client.wazuh_get_cluster_nodes()
+    with pytest.raises(requests.HTTPError):
+        client.wazuh_get_nodes_healtchecks()
@@ -0,0 +1,47 @@
+METRICS = {
+    "bytes": {"received": 1200, "sent": 300},
+    "tcp_sessions": 4,
+    "keys_reload_count": 0,
+    "enabled": True,
+    "version": "4.8.0",
+    "messages": {
+        "received_breakdown": {
+            "control": 3,
+            "event": 40,
+            "control_breakdown": {"keepalive": 2, "shutdown": 1},
+        },
+    },
+}
+
+
+def test_flatten_daemon_metrics(exporter):
+    assert list(exporter.flatten_daemon_metrics(METRICS)) == [
+        ("bytes_received", None, 1200),
+        ("bytes_sent", None, 300),
+        ("tcp_sessions", None, 4),
+        ("keys_reload_count", None, 0),
+        # A total and its own breakdown never share a family
+        ("messages_received_breakdown", "control", 3),
+        ("messages_received_breakdown", "event", 40),
+        ("messages_received_control_breakdown", "keepalive", 2),
+        ("messages_received_control_breakdown", "shutdown", 1),
+    ]
+
+
+def test_daemon_stats_metrics(exporter):
+    remoted = {
+        "name": "wazuh-remoted",
+        "uptime": "2024-01-01T00:00:00+00:00",
+        "metrics": dict(METRICS, queues={"received": {"size": 131072, "usage": 0.25}}),
+    }
+    families = {family.name: family for family in exporter.daemon_stats_metrics([("master", [remoted])])}
+
+    assert families["wazuh_daemon_tcp_sessions"].type == "gauge"
+    assert families["wazuh_daemon_bytes_received"].type == "counter"
+    breakdown = families["wazuh_daemon_messages_received_breakdown"]
+    assert [(sample.labels, sample.value) for sample in breakdown.samples if sample.name.endswith("_total")] == [
+        ({"daemon": "wazuh-remoted", "type": "control", "node_name": "master"}, 3),
+        ({"daemon": "wazuh-remoted", "type": "event", "node_name": "master"}, 40),
+    ]
+    assert [sample.value for sample in families["wazuh_daemon_queue_usage"].samples] == [0.25]
+    assert [sample.value for sample in families["wazuh_daemon_start_time_seconds"].samples] == [1704067200]
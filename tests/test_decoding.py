@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from wazuh.decoding import CHUNK_SIZE, AffectedItems
+
+ITEMS = [
+    {"id": "000", "name": "manager", "os": {"name": "Debian"}},
+    {"id": "001", "name": "agent-é", "labels": ["a]", "{b", "\"c,"]},
+    {"id": "002", "name": "エージェント 🛡", "groups": []},
+] + [{"id": f"{i:03d}", "name": f"agent-{i}"} for i in range(3, 2000)]
+
+
+def chunked(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def answer(items, **extra):
+    data = {"affected_items": items, "total_affected_items": len(items), "total_failed_items": 0, "failed_items": []}
+    data.update(extra)
+    return json.dumps({"data": data, "message": "All selected agents information was returned", "error": 0})
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000, 4096, CHUNK_SIZE])
+def test_chunk_boundaries(size):
+    # Multibyte UTF-8 characters are split across chunks by the small sizes
+    data = answer(ITEMS).encode()
+    items = AffectedItems(chunked(data, size))
+    assert list(items) == ITEMS
+    assert items.document["data"]["affected_items"] == []
+    assert items.document["data"]["total_affected_items"] == len(ITEMS)
+    assert items.document["error"] == 0
+
+
+def test_ensure_ascii_escapes():
+    data = json.dumps({"data": {"affected_items": ITEMS[:3]}}, ensure_ascii=True).encode()
+    assert list(AffectedItems(chunked(data, 5))) == ITEMS[:3]
+
+
+def test_empty_and_spaced():
+    data = b' {\n  "data" : {\n    "affected_items" : [ ] ,\n    "total_affected_items": 0\n  }\n}\n'
+    items = AffectedItems(chunked(data, 4))
+    assert list(items) == []
+    assert items.document == {"data": {"affected_items": [], "total_affected_items": 0}}
+
+
+def test_other_key_order_falls_back():
+    data = json.dumps({"error": 0, "data": {"total_affected_items": len(ITEMS), "affected_items": ITEMS}}).encode()
+    items = AffectedItems(chunked(data, 100))
+    assert list(items) == ITEMS
+    assert items.document["data"]["total_affected_items"] == len(ITEMS)
+
+
+@pytest.mark.parametrize("cut", [10, 60, 200, -40, -1])
+def test_truncated_answer(cut):
+    data = answer(ITEMS[:50]).encode()[:cut]
+    with pytest.raises(ValueError):
+        list(AffectedItems(chunked(data, 16)))
+
+
+def test_closes_the_answer():
+    class Chunks(list):
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    chunks = Chunks(chunked(answer(ITEMS).encode(), 512))
+    for _ in AffectedItems(chunks):
+        break
+    assert chunks.closed
@@ -0,0 +1,71 @@
+from prometheus_client import Counter
+
+from wazuh.emitter import Field, FieldEmitter, parse_version
+
+
+def missing_counter():
+    return Counter("missing_fields", "Missing fields", ["endpoint", "field"], registry=None)
+
+
+def samples(metric):
+    return [(sample.name, sample.labels, sample.value) for sample in metric.samples]
+
+
+def test_parse_version():
+    assert parse_version("v4.7.1") == (4, 7, 1)
+    assert parse_version("4.3") == (4, 3)
+    assert parse_version(None) is None
+    assert parse_version("unknown") is None
+
+
+def test_fields_of_the_version_are_emitted():
+    emitter = FieldEmitter(
+        "stats",
+        "stats",
+        "Statistics",
+        label="field",
+        fields=(Field("total"), Field("old", until=(4, 7, 0)), Field("new", since=(4, 7, 0))),
+    )
+    item = {"total": 3, "old": 1, "new": 2}
+    missing = missing_counter()
+    assert samples(emitter.emit([item], (4, 6, 0), missing)) == [
+        ("total", {"field": "total"}, 3),
+        ("old", {"field": "old"}, 1),
+    ]
+    assert [name for name, _, _ in samples(emitter.emit([item], (4, 7, 0), missing))] == ["total", "new"]
+    # Every field is emitted when the version is unknown
+    assert [name for name, _, _ in samples(emitter.emit([item], None, missing))] == ["total", "old", "new"]
+
+
+def test_labels_sample_name_and_missing_fields():
+    emitter = FieldEmitter(
+        "stats", "stats", "Statistics", label="field", fields=(Field("a"), Field("b")), sample_name="stats"
+    )
+    missing = missing_counter()
+    metric = emitter.emit([{"a": 1}], (4, 8, 0), missing, (("node_name", "master"),))
+    emitter.emit([{"a": 2, "b": 3}], (4, 8, 0), missing, (("node_name", "worker"),), metric=metric)
+    assert samples(metric) == [
+        ("stats", {"node_name": "master", "field": "a"}, 1),
+        ("stats", {"node_name": "worker", "field": "a"}, 2),
+        ("stats", {"node_name": "worker", "field": "b"}, 3),
+    ]
+    assert missing.labels("stats", "b")._value.get() == 1
+
+
+def test_exporter_tables(exporter):
+    for emitter in (exporter.analysisd_stats_emitter, exporter.remote_stats_emitter):
+        names = [field.name for field in emitter.fields]
+        assert len(names) == len(set(names)), emitter.family
+    # Rates and counters dropped by the 4.7 statistics API are only expected from older managers
+    analysisd = {field.name: 1 for field in exporter.analysisd_stats_emitter.fields}
+    missing = missing_counter()
+
+    def emitted(version):
+        metric = exporter.analysisd_stats_emitter.emit([analysisd], version, missing)
+        return {sample.labels["analysisd_stats"] for sample in metric.samples}
+
+    assert emitted((4, 6, 0)) - emitted((4, 7, 0)) == {name for name in analysisd if name.endswith("_edps") or name.endswith("_mdps")} | {
+        "hostinfo_events_decoded"
+    }
+    remote = exporter.remote_stats_emitter.emit([{"queued_msgs": 1, "recv_bytes": 2}], (4, 8, 0), missing)
+    assert samples(remote) == [("recv_bytes", {"manager_stats_remote": "recv_bytes"}, 2)]
@@ -0,0 +1,74 @@
+import gzip
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import GaugeMetricFamily
+
+from wazuh.exposition import ExpositionCache
+from wazuh.server import make_responder
+
+
+class Collector:
+    def __init__(self):
+        self.version = 0
+        self.collects = 0
+
+    def collect(self):
+        self.collects += 1
+        metric = GaugeMetricFamily("wazuh_data_version", "Version of the collected data")
+        metric.add_metric([], self.version)
+        yield metric
+
+
+class Health:
+    def live(self):
+        return True, {"status": "ok"}
+
+    ready = live
+
+
+def serve(collector, max_age=30):
+    registry = CollectorRegistry()
+    registry.register(collector)
+    exposition = ExpositionCache(registry, lambda: collector.version, max_age=max_age)
+    return make_responder(registry, Health(), exposition=exposition)
+
+
+def header(headers, name):
+    return dict(headers)[name]
+
+
+def test_rendered_once_per_data_version():
+    collector = Collector()
+    respond = serve(collector)
+    collector.collects = 0
+    first = respond("/metrics", "", {})
+    assert respond("/metrics", "", {}) == first and collector.collects == 1
+    collector.version = 1
+    status, headers, body = respond("/metrics", "", {})
+    assert b"wazuh_data_version 1.0" in body and collector.collects == 2
+    assert header(headers, "ETag") != header(first[1], "ETag")
+
+
+def test_etag_hit_and_miss():
+    collector = Collector()
+    respond = serve(collector)
+    status, headers, body = respond("/metrics", "", {})
+    etag = header(headers, "ETag")
+    status, headers, body = respond("/metrics", "", {"if-none-match": f'"other", {etag}'})
+    assert status == "304 Not Modified" and body == b"" and header(headers, "ETag") == etag
+    # The gzip body has its own tag, the identity tag does not match it
+    status, headers, body = respond("/metrics", "", {"if-none-match": etag, "accept-encoding": "gzip"})
+    assert status == "200 OK" and header(headers, "Content-Encoding") == "gzip"
+    assert b"wazuh_data_version 0.0" in gzip.decompress(body)
+    collector.version = 1
+    status, headers, body = respond("/metrics", "", {"if-none-match": etag})
+    assert status == "200 OK" and header(headers, "ETag") != etag
+
+
+def test_rendered_again_after_max_age():
+    collector = Collector()
+    respond = serve(collector, max_age=0)
+    collector.collects = 0
+    respond("/metrics", "", {})
+    respond("/metrics", "", {})
+    assert collector.collects == 2
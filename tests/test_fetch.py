@@ -0,0 +1,44 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from wazuh.scrape import current_deadline, scrape_context, with_timeout
+
+
+def test_each_call_has_its_own_timeout(exporter):
+    def slow():
+        time.sleep(0.3)
+        return "slow"
+
+    def deadline():
+        return time.monotonic(), current_deadline()
+
+    calls = {"slow": slow, "queued": with_timeout(deadline, 1.0, time.monotonic() + 5)}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        started = time.monotonic()
+        results = list(exporter.gather(executor, calls, 5, call_timeout=0.2))
+    assert [(key, ok) for key, ok, _ in results] == [("slow", False), ("queued", True)]
+    # The queued call started once the worker was free and got its whole timeout from then
+    assert isinstance(results[0][2], exporter.FuturesTimeoutError)
+    now, request_deadline = results[1][2]
+    assert now - started >= 0.3 and now - 0.1 < request_deadline - 1.0 <= now
+
+
+def test_timeout_caps_the_call_timeouts(exporter):
+    calls = {"slow": lambda: time.sleep(0.5), "deadline": with_timeout(current_deadline, 10, 1234.0)}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        started = time.monotonic()
+        results = {key: (ok, data) for key, ok, data in exporter.gather(executor, calls, 0.1, call_timeout=10)}
+        assert time.monotonic() - started < 0.4
+    assert results["deadline"] == (True, 1234.0)
+    assert not results["slow"][0]
+
+
+def test_scrapes_share_a_collection_with_the_same_budget(exporter):
+    with scrape_context(10.0, frozenset(["agents"])):
+        key = exporter.scrape_key()
+    with scrape_context(10.0, frozenset(["agents"])):
+        assert exporter.scrape_key() == key
+    with scrape_context(5.0, frozenset(["agents"])):
+        assert exporter.scrape_key() != key
+    with scrape_context(10.0, None):
+        assert exporter.scrape_key() != key
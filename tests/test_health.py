@@ -0,0 +1,43 @@
+from wazuh.health import HealthCheck
+
+
+class FakeTokenManager:
+    def __init__(self, token=None, error=None):
+        self.token = token
+        self.error = error
+
+    def valid(self):
+        return self.token is not None
+
+
+def test_on_demand_ready_once_logged_in():
+    tokens = FakeTokenManager()
+    health = HealthCheck(tokens, max_age=300, fresh=False)
+    assert not health.ready()[0]
+    tokens.token = "token"
+    assert health.ready()[0]
+    # Neither a failed renewal nor the lack of scrapes takes the pod out of its Service
+    tokens.error = RuntimeError("renewal failed")
+    ready, state = health.ready()
+    assert ready and state["authentication_error"] == "RuntimeError('renewal failed')"
+
+
+def test_on_demand_ready_after_a_fetch():
+    health = HealthCheck(FakeTokenManager(), max_age=300, fresh=False)
+    health.record_success()
+    health.last_success -= 3600
+    assert health.ready()[0]
+
+
+def test_background_polling_requires_a_recent_fetch():
+    tokens = FakeTokenManager("token")
+    health = HealthCheck(tokens, max_age=300)
+    assert not health.ready()[0]
+    health.record_success()
+    assert health.ready()[0]
+    tokens.error = RuntimeError("login failed")
+    assert not health.ready()[0]
+    tokens.error = None
+    health.last_success -= 301
+    ready, state = health.ready()
+    assert not ready and state["status"] == "unavailable"
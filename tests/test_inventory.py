@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from conftest import ago
+from wazuh.inventory import SEEN_ACTIVE_AT, AgentIndex
+
+
+def agent(agent_id, keepalive, status="active"):
+    return {"id": agent_id, "status": status, "dateAdd": ago(86400), "lastKeepAlive": keepalive, "name": agent_id}
+
+
+def test_delta_refreshes_keepalives(fake_client):
+    agents = [agent("001", ago(5)), agent("002", ago(5)), agent("003", ago(3600), "disconnected")]
+    fake_client.agents = agents
+    index = AgentIndex(fake_client, ["lastKeepAlive", "name"], keepalive_lag=60)
+    index.sync()
+    # Five minutes later 001 still keeps alive and 002 stopped four minutes ago but is still active
+    index.agents["001"]["lastKeepAlive"] = index.agents["001"][SEEN_ACTIVE_AT] = ago(300)
+    agents[0]["lastKeepAlive"] = ago(1)
+    agents[1]["lastKeepAlive"] = ago(240)
+    index.sync()
+
+    assert index.agents["002"]["lastKeepAlive"] == index.agents["002"][SEEN_ACTIVE_AT] == agents[1]["lastKeepAlive"]
+    # Raised to the lower bound of the lag, never past the actual keepalive, lastKeepAlive stays the API value
+    assert ago(61) <= index.agents["001"][SEEN_ACTIVE_AT] <= ago(59) < agents[0]["lastKeepAlive"]
+    assert index.agents["001"]["lastKeepAlive"] <= ago(300)
+    assert index.agents["003"]["lastKeepAlive"] == agents[2]["lastKeepAlive"]
+    assert {"status": "active", "older_than": "60s", "select": "id,lastKeepAlive,status"} in fake_client.queries
+
+
+def test_delta_only_downloads_recently_disconnected_agents(fake_client):
+    agents = [agent(f"{i:03d}", ago(5)) for i in range(5)] + [
+        agent(f"{i:03d}", ago(86400), "disconnected") for i in range(5, 50)
+    ]
+    fake_client.agents = agents
+    index = AgentIndex(fake_client, ["lastKeepAlive", "name"], disconnection_time=600)
+    index.sync()
+    agents[0].update(status="disconnected", lastKeepAlive=ago(620))
+    fake_client.queries.clear()
+    index.synced_at -= timedelta(seconds=30)
+    assert index.agents["000"]["status"] == "active"
+    index.sync()
+
+    assert index.agents["000"]["status"] == "disconnected"
+    assert index.fetched.labels("delta")._value.get() == 1
+    assert index.fetched.labels("inactive")._value.get() == 0
+
+
+def test_delta_resyncs_inactive_agents_when_their_number_changes(fake_client):
+    agents = [agent("001", ago(5)), agent("002", ago(86400), "disconnected"), agent("003", ago(86400), "pending")]
+    fake_client.agents = agents
+    index = AgentIndex(fake_client, ["lastKeepAlive", "name"])
+    index.sync()
+    # 002 reconnected and 003 was removed
+    agents[1].update(status="active", lastKeepAlive=ago(1))
+    del agents[2]
+    index.sync()
+
+    assert sorted(index.agents) == ["001", "002"]
+    assert index.agents["002"]["status"] == "active"
+    assert index.agents["002"][SEEN_ACTIVE_AT] == agents[1]["lastKeepAlive"]
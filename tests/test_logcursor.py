@@ -0,0 +1,24 @@
+from wazuh.logcursor import LogCursor
+
+
+def log(second, description="Evaluation finished.", level="info"):
+    return {
+        "timestamp": f"2024-01-01T00:00:{second:02d}Z",
+        "tag": "wazuh-modulesd:sca",
+        "level": level,
+        "description": description,
+    }
+
+
+def test_identical_entries_of_one_second_are_all_counted(fake_client):
+    logs = fake_client.logs = [log(0), log(1), log(1, "Starting evaluation.")]
+    cursor = LogCursor(fake_client, page_size=2)
+    assert cursor.poll() == ({}, [])
+    # Logged later within the cursor second, identical to an entry already counted
+    logs += [log(1), log(1, "Starting evaluation.", "error"), log(2), log(2)]
+    assert cursor.poll()[0] == {("wazuh-modulesd:sca", "info"): 3, ("wazuh-modulesd:sca", "error"): 1}
+    # Read again by the next poll, none of them is counted twice
+    logs.append(log(2))
+    counts, recent = cursor.poll()
+    assert counts == {("wazuh-modulesd:sca", "info"): 4, ("wazuh-modulesd:sca", "error"): 1}
+    assert cursor.poll()[0] == counts
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from wazuh import ratelimit
+from wazuh.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def clock(clock):
+    clock.install(ratelimit)
+    return clock
+
+
+def wait_until(condition, timeout=5):
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop
+        time.sleep(0.001)
+
+
+def tick(limiter, clock, seconds):
+    """Let time pass and wake the waiters up"""
+    clock.now += seconds
+    with limiter.condition:
+        limiter.condition.notify_all()
+
+
+def available_tokens(limiter):
+    return next(metric for metric in limiter.collect() if metric.name.endswith("available_tokens")).samples[0].value
+
+
+def test_refill(clock):
+    limiter = RateLimiter(60, 5)
+    for _ in range(5):
+        assert limiter.acquire("agents") == 0.0
+    assert available_tokens(limiter) == 0
+    clock.now += 2.5
+    assert available_tokens(limiter) == 2.5
+    # Never more than the burst after an idle period
+    clock.now += 100
+    assert available_tokens(limiter) == 5
+
+
+def test_waiters_served_by_priority_then_arrival(clock):
+    limiter = RateLimiter(60, 1)
+    limiter.acquire("agents")
+    served = []
+
+    def send(endpoint, priority):
+        limiter.acquire(endpoint, priority)
+        served.append(endpoint)
+
+    threads = []
+    for endpoint, priority in [("logs", 3), ("agents", 1), ("api_info", 1), ("login", -1)]:
+        threads.append(threading.Thread(target=send, args=(endpoint, priority)))
+        threads[-1].start()
+        wait_until(lambda: len(limiter.waiting) == len(threads))
+    for count in range(1, len(threads) + 1):
+        tick(limiter, clock, 1)
+        wait_until(lambda: len(served) == count)
+    for thread in threads:
+        thread.join()
+    assert served == ["login", "agents", "api_info", "logs"]
+    assert limiter.throttled.labels("logs")._value.get() == 1
+    assert limiter.consumed.labels("agents")._value.get() == 2
+
+
+def test_deadline(clock):
+    limiter = RateLimiter(60, 1)
+    limiter.acquire("agents")
+    with pytest.raises(TimeoutError):
+        limiter.acquire("logs", deadline=clock.now)
+    errors = []
+
+    def send():
+        try:
+            limiter.acquire("logs", deadline=clock.now + 0.5)
+        except TimeoutError as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    wait_until(lambda: limiter.waiting)
+    tick(limiter, clock, 0.6)
+    thread.join(5)
+    assert len(errors) == 1 and not limiter.waiting
+    # The token it waited for is left to the next request
+    tick(limiter, clock, 0.5)
+    assert limiter.acquire("agents") == 0.0
@@ -0,0 +1,77 @@
+import threading
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import GaugeMetricFamily
+
+from wazuh.scrape import current_collectors, current_scrape_timeout, with_scrape_context
+from wazuh.server import make_responder
+
+COLLECTORS = ["agents", "cluster", "logs"]
+
+
+class Collector:
+    """Export the collectors selected by the scrape, as seen from a worker thread"""
+
+    def __init__(self):
+        self.scrapes = []
+
+    def collect(self):
+        seen = []
+        selected = with_scrape_context(current_collectors)
+        worker = threading.Thread(target=lambda: seen.append(selected()))
+        worker.start()
+        worker.join(5)
+        self.scrapes.append((current_scrape_timeout(), current_collectors(), seen[0]))
+        metric = GaugeMetricFamily("wazuh_collector_selected", "Selected collectors", labels=["collector"])
+        for name in sorted(current_collectors() or COLLECTORS):
+            metric.add_metric([name], 1)
+        yield metric
+
+
+class Health:
+    def live(self):
+        return True, {"status": "ok"}
+
+    ready = live
+
+
+def serve(exposition=None):
+    collector = Collector()
+    registry = CollectorRegistry()
+    registry.register(collector)
+    return collector, make_responder(registry, Health(), exposition=exposition, collectors=COLLECTORS)
+
+
+def test_every_collector_by_default():
+    collector, respond = serve()
+    status, headers, body = respond("/metrics", "", {"x-prometheus-scrape-timeout-seconds": "10"})
+    assert status == "200 OK" and body.count(b"wazuh_collector_selected{") == 3
+    assert collector.scrapes == [(10.0, None, None)]
+
+
+def test_selected_collectors():
+    collector, respond = serve()
+    status, headers, body = respond("/metrics", "collect[]=agents&collect[]=logs", {})
+    assert status == "200 OK" and body.count(b"wazuh_collector_selected{") == 2
+    assert collector.scrapes == [(None, frozenset(["agents", "logs"]), frozenset(["agents", "logs"]))]
+    # The selection does not leak to the next scrape answered by the thread
+    respond("/metrics", "", {})
+    assert collector.scrapes[-1] == (None, None, None)
+
+
+def test_unknown_collector():
+    collector, respond = serve()
+    status, headers, body = respond("/metrics", "collect[]=agents&collect[]=rules", {})
+    assert status == "400 Bad Request"
+    assert body == b"Unknown collectors rules, available: agents, cluster, logs\n"
+    assert collector.scrapes == []
+
+
+def test_selection_bypasses_the_exposition_cache():
+    class Exposition:
+        def get(self, accept):
+            raise AssertionError("a selection is never served from the cache")
+
+    collector, respond = serve(Exposition())
+    status, headers, body = respond("/metrics", "collect[]=cluster", {})
+    assert status == "200 OK" and collector.scrapes[0][1] == frozenset(["cluster"])
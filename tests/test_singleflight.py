@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from wazuh import singleflight
+from wazuh.singleflight import SingleFlight
+
+
+class WaitedEvent(threading.Event):
+    """Event counting the threads waiting for it"""
+
+    def __init__(self):
+        super().__init__()
+        self.waiters = 0
+
+    def wait(self, timeout=None):
+        self.waiters += 1
+        return super().wait(timeout)
+
+
+class Call(singleflight.Call):
+    def __init__(self):
+        super().__init__()
+        self.done = WaitedEvent()
+
+
+@pytest.fixture
+def flight(monkeypatch):
+    monkeypatch.setattr(singleflight, "Call", Call)
+    return SingleFlight()
+
+
+def wait_until(condition, timeout=5):
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop
+        time.sleep(0.001)
+
+
+def run_concurrently(flight, key, function, followers=3):
+    """
+    Call function as the leader of key and join it with the followers while it runs
+    :return:
+    results or exceptions of all the calls
+    """
+    release = threading.Event()
+    results = []
+
+    def leader():
+        release.wait(5)
+        return function()
+
+    def call(function):
+        try:
+            results.append(flight.do(key, function))
+        except Exception as error:
+            results.append(error)
+
+    threads = [threading.Thread(target=call, args=(leader,))]
+    threads[0].start()
+    wait_until(lambda: key in flight.calls)
+    for _ in range(followers):
+        threads.append(threading.Thread(target=call, args=(lambda: "follower",)))
+        threads[-1].start()
+    wait_until(lambda: flight.calls[key].done.waiters == followers)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_calls_share_the_result(flight):
+    calls = []
+    results = run_concurrently(flight, "collect", lambda: calls.append(1) or "leader")
+    assert results == ["leader"] * 4 and len(calls) == 1
+    assert flight.calls == {}
+
+
+def test_concurrent_calls_share_the_exception(flight):
+    error = RuntimeError("API down")
+
+    def fail():
+        raise error
+
+    assert run_concurrently(flight, "collect", fail) == [error] * 4
+    # The next call runs again
+    assert flight.do("collect", lambda: "recovered") == "recovered"
+
+
+def test_other_keys_do_not_wait(flight):
+    release = threading.Event()
+    thread = threading.Thread(target=flight.do, args=("slow", lambda: release.wait(5)))
+    thread.start()
+    wait_until(lambda: "slow" in flight.calls)
+    assert flight.do("fast", lambda: "fast") == "fast"
+    release.set()
+    thread.join(5)
@@ -0,0 +1,46 @@
+import json
+import zlib
+
+import pytest
+
+from wazuh import snapshot
+from wazuh.snapshot import SNAPSHOT_VERSION, SnapshotStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / "snapshot"), max_age=3600)
+
+
+def write(store, payload):
+    with open(store.path, "wb") as snapshot_file:
+        snapshot_file.write(zlib.compress(json.dumps(payload).encode()))
+
+
+def test_round_trip(store, tmp_path):
+    endpoints = {"agents": [{"id": "001", "name": "agent-é"}], "api_info": {"api_version": "4.8.0"}}
+    store.save(dict(endpoints, logs=({("tag", "info"): 1}, [])))
+    # Data that is not JSON is left out, no temporary file is left behind
+    loaded, age = store.load()
+    assert loaded == endpoints and 0 <= age < 5
+    assert [path.name for path in tmp_path.iterdir()] == ["snapshot"]
+
+
+def test_missing_file(store):
+    assert store.load() == ({}, None)
+
+
+@pytest.mark.parametrize("content", [b"", b"not zlib", zlib.compress(b"{truncated")])
+def test_corrupt_file(store, content):
+    with open(store.path, "wb") as snapshot_file:
+        snapshot_file.write(content)
+    assert store.load() == ({}, None)
+
+
+def test_stale_or_other_version(store, monkeypatch):
+    write(store, {"version": SNAPSHOT_VERSION - 1, "saved_at": snapshot.time.time(), "endpoints": {"agents": []}})
+    assert store.load() == ({}, None)
+    store.save({"agents": []})
+    now = snapshot.time.time()
+    monkeypatch.setattr(snapshot.time, "time", lambda: now + 3601)
+    assert store.load() == ({}, None)
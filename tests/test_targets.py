@@ -0,0 +1,69 @@
+import json
+
+import pytest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from wazuh.targets import load_targets, merge_families
+
+DEFAULTS = {"protocol": "https", "port": "55000", "user": "wazuh", "password": "wazuh"}
+
+
+@pytest.fixture
+def targets_file(tmp_path):
+    def write(targets):
+        path = tmp_path / "targets.json"
+        path.write_text(json.dumps(targets))
+        return str(path)
+
+    return write
+
+
+def test_load_targets_applies_the_defaults(targets_file):
+    path = targets_file([{"name": "eu", "host": "wazuh-eu", "port": 55001}, {"host": "wazuh-us", "user": "exporter"}])
+    assert load_targets(path, DEFAULTS) == [
+        {"name": "eu", "protocol": "https", "host": "wazuh-eu", "port": 55001, "user": "wazuh", "password": "wazuh"},
+        {
+            "name": "wazuh-us",
+            "protocol": "https",
+            "host": "wazuh-us",
+            "port": 55000,
+            "user": "exporter",
+            "password": "wazuh",
+        },
+    ]
+
+
+@pytest.mark.parametrize(
+    "targets, error",
+    [
+        ([], "non empty list"),
+        ({"host": "wazuh-eu"}, "non empty list"),
+        ([{"name": "eu"}], "misses host"),
+        ([{"host": "wazuh-eu"}, {"name": "wazuh-eu", "host": "wazuh-us"}], "Duplicated target names in .*: wazuh-eu"),
+    ],
+)
+def test_load_targets_rejects_invalid_files(targets_file, targets, error):
+    with pytest.raises(ValueError, match=error):
+        load_targets(targets_file(targets), DEFAULTS)
+
+
+def test_merge_families():
+    def families(agents):
+        status = GaugeMetricFamily("wazuh_agent_status", "Agent status", labels=["agent"])
+        for agent in agents:
+            status.add_metric([agent], 1)
+        requests = CounterMetricFamily("wazuh_exporter_requests", "Requests")
+        requests.add_metric([], len(agents))
+        return [status, requests]
+
+    status, requests = merge_families([("eu", families(["001", "002"])), ("us", families(["001"]))])
+    assert status.type == "gauge" and requests.type == "counter"
+    assert [(sample.labels, sample.value) for sample in status.samples] == [
+        ({"agent": "001", "target": "eu"}, 1),
+        ({"agent": "002", "target": "eu"}, 1),
+        ({"agent": "001", "target": "us"}, 1),
+    ]
+    assert [(sample.name, sample.labels, sample.value) for sample in requests.samples] == [
+        ("wazuh_exporter_requests_total", {"target": "eu"}, 2),
+        ("wazuh_exporter_requests_total", {"target": "us"}, 1),
+    ]
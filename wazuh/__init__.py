@@ -16,21 +16,51 @@
 #  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
 #  STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
 #  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
-import json
 import logging
+import time
 from base64 import b64encode
+from urllib.parse import urlencode
 
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from . import decoding
+from .auth import TokenManager
+from .instrumentation import ClientMetrics
 from .logger_helper import get_logger
+from .ratelimit import RateLimiter, current_priority
+from .scrape import current_deadline
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logger = get_logger()
 
+# Answers of an overloaded manager or proxy, sent again after a backoff
+RETRY_STATUSES = frozenset([502, 503, 504])
+# Wazuh API error code of the cluster endpoints when the cluster is disabled
+CLUSTER_NOT_RUNNING = 3013
+
 
 class Wazuh:
-    def __init__(self, protocol, host, port, login_endpoint, user, password):
+    def __init__(
+        self,
+        protocol,
+        host,
+        port,
+        login_endpoint,
+        user,
+        password,
+        token_renew_before=60,
+        pool_size=10,
+        connect_timeout=5,
+        read_timeout=10,
+        retries=2,
+        retry_backoff=0.5,
+        retry_status=True,
+        rate_limit=0,
+        rate_limit_burst=20,
+    ):
         self.protocol = protocol
         self.host = host
         self.port = port
@@ -38,17 +68,53 @@ class Wazuh:
         self.user = user
         self.password = password
         self.url = f"{self.protocol}://{self.host}:{self.port}"
+        self.token_manager = TokenManager(self.authenticate, renew_before=token_renew_before)
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = self.create_session(pool_size, retries, retry_backoff)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_statuses = RETRY_STATUSES if retry_status else ()
+        self.metrics = ClientMetrics()
+        # Requests per minute budget of this Wazuh API, 0 sends requests without waiting
+        self.limiter = RateLimiter(rate_limit, rate_limit_burst) if rate_limit > 0 else None
+
+    @staticmethod
+    def create_session(pool_size, retries, retry_backoff):
+        """
+        Build a keep-alive session shared by every request to the manager
+        Only the connection errors are retried here, the request did not reach the manager. Read timeouts are not
+        retried, the manager is already busy with the request, and the answers are retried by send.
+        :return:
+        requests session
+        """
+        retry = Retry(
+            total=retries,
+            read=0,
+            backoff_factor=retry_backoff,
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.verify = False  # nosec
+        return session
 
     # skipcq: PTC-W6001
-    def login(self):
+    def authenticate(self):
         login_url = f"{self.url}/{self.login_endpoint}"
         basic_auth = f"{self.user}:{self.password}".encode()
         login_headers = {
             "Content-Type": "application/json",
             "Authorization": f"Basic {b64encode(basic_auth).decode()}",
         }
-        response = requests.get(login_url, headers=login_headers, verify=False)  # nosec
-        token = json.loads(response.content.decode())["data"]["token"]
+        # Every other request waits for the token, the login is sent first
+        response = self.send(login_url, login_headers, "login", priority=-1)
+        return decoding.loads(response.content)["data"]["token"]
+
+    def login(self):
+        token = self.token_manager.get()
         requests_headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {token}",
@@ -56,213 +122,226 @@ class Wazuh:
         return requests_headers
 
     # skipcq: PTC-W6001
-    def wazuh_api_info(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/", headers=requests_headers, verify=False  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]
+    def send(self, url, headers, label, stream=False, priority=None):
+        """
+        Send a GET request and record its latency, status code and size
+        :param label: endpoint name used in the exporter metrics
+        :param stream: do not read the body, its size is recorded while it is read
+        :param priority: rate limiter priority, the priority of this thread when None
+        :return:
+        response
+        """
+        if priority is None:
+            priority = current_priority()
+        attempt = 0
+        while True:
+            # Every attempt takes a token of the request budget
+            if self.limiter is not None:
+                self.limiter.acquire(label, priority, current_deadline())
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+            except requests.RequestException as error:
+                self.metrics.observe(label, type(error).__name__, time.perf_counter() - started)
+                raise
+            size = 0 if stream else len(response.content)
+            self.metrics.observe(label, str(response.status_code), time.perf_counter() - started, size)
+            if response.status_code not in self.retry_statuses or attempt >= self.retries:
+                return response
+            delay = self.retry_backoff * 2**attempt
+            deadline = current_deadline()
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                return response
+            response.close()
+            time.sleep(delay)
+            attempt += 1
 
-    # skipcq: PTC-W6001
-    def wazuh_get_daemons_stat(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/status",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def request(self, endpoint, label=None, stream=False):
+        if label is None:
+            label = endpoint.split("?")[0] or "/"
+        requests_headers = self.login()
+        response = self.send(f"{self.url}/{endpoint}", requests_headers, label, stream)
+        if response.status_code == 401:
+            logger.info(f"Wazuh API token rejected on {endpoint}, re-authenticating")
+            response.close()
+            self.token_manager.invalidate(requests_headers["Authorization"][len("Bearer "):])
+            response = self.send(f"{self.url}/{endpoint}", self.login(), label, stream)
+        return response
 
-    # skipcq: PTC-W6001
-    def wazuh_get_base_info(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/info", headers=requests_headers, verify=False  # nosec
-        )
+    def get(self, endpoint, label=None):
+        """
+        :return:
+        (HTTP status code, decoded answer)
+        """
+        response = self.request(endpoint, label)
+        answer = decoding.loads(response.content)
         if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+            logging.warning(f"Got response http code {response.status_code}, response body {answer['detail']}")
+        return response.status_code, answer
 
-    # skipcq: PTC-W6001
-    def wazuh_get_configuration(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/configuration",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def get_items(self, endpoint, label=None):
+        return self.get(endpoint, label)[1]["data"]["affected_items"]
 
-    # skipcq: PTC-W6001
-    def wazuh_validate_configuration(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/configuration/validation",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
+    def stream_items(self, endpoint, label):
+        """
+        Decode the affected items of a large answer while it is read
+        :return:
+        AffectedItems, iterable once
+        """
+        response = self.request(endpoint, label, stream=True)
         if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+            answer = decoding.loads(response.content)
+            self.metrics.received(label, len(response.content))
+            logging.warning(f"Got response http code {response.status_code}, response body {answer['detail']}")
+            raise requests.HTTPError(f"{endpoint} answered {response.status_code}", response=response)
+        return decoding.AffectedItems(self.read_chunks(response, label))
 
-    # skipcq: PTC-W6001
-    def wazuh_get_stats(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/stats?pretty=true",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
+    def read_chunks(self, response, label):
+        size = 0
+        try:
+            for chunk in response.iter_content(decoding.CHUNK_SIZE):
+                size += len(chunk)
+                yield chunk
+        finally:
+            response.close()
+            self.metrics.received(label, size)
+
+    def wazuh_api_info(self):
+        _, answer = self.get("")
+        return answer["data"]
+
+    def wazuh_get_daemons_stat(self):
+        return self.get_items("manager/status")
+
+    def wazuh_get_base_info(self):
+        return self.get_items("manager/info")
+
+    def wazuh_get_configuration(self):
+        return self.get_items("manager/configuration")
+
+    def wazuh_validate_configuration(self):
+        return self.get_items("manager/configuration/validation")
+
+    def wazuh_get_stats(self):
         try:
-            stat_response = response.json()["data"]["affected_items"]
+            stat_response = self.get_items("manager/stats?pretty=true")
         except KeyError:
             stat_response = {}
         return stat_response
 
-    # skipcq: PTC-W6001
-    def wazuh_get_hourly_stats(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/stats/hourly",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]
+    def wazuh_get_hourly_stats(self):
+        _, answer = self.get("manager/stats/hourly")
+        return answer["data"]
 
-    # skipcq: PTC-W6001
-    def wazuh_get_weekly_stats(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/stats/weekly",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def wazuh_get_weekly_stats(self):
+        return self.get_items("manager/stats/weekly")
 
-    # skipcq: PTC-W6001
-    def wazuh_get_analysisd_stats(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/stats/analysisd",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def wazuh_get_analysisd_stats(self):
+        return self.get_items("manager/stats/analysisd")
 
-    # skipcq: PTC-W6001
-    def wazuh_get_remote_stats(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/stats/remoted",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def wazuh_get_remote_stats(self):
+        return self.get_items("manager/stats/remoted")
 
-    # skipcq: PTC-W6001
-    def wazuh_get_logs(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/logs", headers=requests_headers, verify=False  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def wazuh_get_node_stats(self, node_id):
+        try:
+            stat_response = self.get_items(f"cluster/{node_id}/stats", label="cluster/stats")
+        except KeyError:
+            stat_response = {}
+        return stat_response
 
-    # skipcq: PTC-W6001
-    def wazuh_get_logs_summary(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/manager/logs/summary",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def wazuh_get_node_analysisd_stats(self, node_id):
+        return self.get_items(f"cluster/{node_id}/stats/analysisd", label="cluster/stats/analysisd")
 
-    # skipcq: PTC-W6001
-    def wazuh_get_agent_connection(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/agents?pretty&offset=0&sort=status",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def wazuh_get_node_remote_stats(self, node_id):
+        return self.get_items(f"cluster/{node_id}/stats/remoted", label="cluster/stats/remoted")
 
-    # skipcq: PTC-W6001
-    def wazuh_get_agents_overview(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/overview/agents",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]
+    def wazuh_get_daemons_stats(self, daemons, node_id=None):
+        """
+        Statistics of several daemons in one request, Wazuh >= 4.7
+        :param daemons: daemon names e.g. wazuh-analysisd
+        :param node_id: cluster node, the manager answering the API when None
+        """
+        query = urlencode({"daemons_list": ",".join(daemons)})
+        if node_id is None:
+            return self.get_items(f"manager/daemons/stats?{query}", label="manager/daemons/stats")
+        return self.get_items(f"cluster/{node_id}/daemons/stats?{query}", label="cluster/daemons/stats")
 
-    # skipcq: PTC-W6001
-    def wazuh_get_nodes_healtchecks(self, requests_headers):
-        response = requests.get(
-            f"{self.url}/cluster/healthcheck",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-            return None
-        else:
-            return response.json()["data"]["affected_items"]
+    def wazuh_get_logs(self, params=None):
+        """
+        :param params: query parameters e.g. offset, limit, sort or q, the API defaults when None
+        """
+        endpoint = f"manager/logs?{urlencode(params)}" if params else "manager/logs"
+        return self.get_items(endpoint)
 
-    # skipcq: PTC-W6001
-    def wazuh_get_last_scan_syscheck(self, requests_headers, agent_id):
-        response = requests.get(
-            f"{self.url}/syscheck/{agent_id}",
-            headers=requests_headers,
-            verify=False,  # nosec
-        )
-        if response.status_code != 200:
-            logging.warning(
-                f"Got response http code {response.status_code}, response body {response.json()['detail']}"
-            )
-        return response.json()["data"]["affected_items"]
+    def wazuh_iter_logs(self, params):
+        """
+        Log entries decoded while the answer is read, for pages too large to be held in memory
+        :param params: query parameters e.g. offset, limit, sort or q
+        :return:
+        AffectedItems, iterable once
+        """
+        return self.stream_items(f"manager/logs?{urlencode(params)}", label="manager/logs")
+
+    def wazuh_get_logs_summary(self):
+        return self.get_items("manager/logs/summary")
+
+    def wazuh_get_agent_connection(self):
+        return self.get_items("agents?pretty&offset=0&sort=status")
+
+    def wazuh_iter_agents(self, select, page_size=500, params=None):
+        """
+        Stream agents page by page, every page is decoded while it is read
+        :param select: agent fields to return, limits the size of every page
+        :param page_size: agents requested per page
+        :param params: extra query parameters e.g. a q filter
+        :return:
+        generator of agents
+        """
+        offset = 0
+        while True:
+            query = {"offset": offset, "limit": page_size, "sort": "+id", "select": ",".join(select), **(params or {})}
+            page = self.stream_items(f"agents?{urlencode(query)}", label="agents")
+            count = 0
+            for agent in page:
+                count += 1
+                yield agent
+            offset += count
+            if not count or offset >= page.document["data"]["total_affected_items"]:
+                return
+
+    def wazuh_count_agents(self, params=None):
+        """
+        :param params: query parameters e.g. a status or q filter
+        :return:
+        number of matching agents, only one agent is downloaded
+        """
+        query = {"offset": 0, "limit": 1, "select": "id", **(params or {})}
+        _, answer = self.get(f"agents?{urlencode(query)}", label="agents")
+        return answer["data"]["total_affected_items"]
+
+    def wazuh_get_agents_overview(self):
+        _, answer = self.get("overview/agents")
+        return answer["data"]
+
+    def get_cluster_items(self, endpoint):
+        """
+        Affected items of a cluster endpoint
+        :return:
+        items, empty when the cluster is not running
+        """
+        status_code, answer = self.get(endpoint)
+        if status_code == 200:
+            return answer["data"]["affected_items"]
+        if answer.get("error") == CLUSTER_NOT_RUNNING:
+            return []
+        # Any other error, e.g. an overloaded master, is a failure and not a cluster without nodes
+        raise requests.HTTPError(f"{endpoint} answered {status_code}")
+
+    def wazuh_get_nodes_healtchecks(self):
+        return self.get_cluster_items("cluster/healthcheck")
+
+    def wazuh_get_cluster_nodes(self):
+        return self.get_cluster_items("cluster/nodes?select=name")
+
+    def wazuh_get_last_scan_syscheck(self, agent_id):
+        return self.get_items(f"syscheck/{agent_id}", label="syscheck")
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from .logger_helper import get_logger
+
+logger = get_logger()
+
+MAX_HEADERS = 100
+
+
+class AsyncServer:
+    """
+    HTTP/1.1 server running on asyncio.
+
+    Only the rendering of a response runs in a thread, reading requests and writing
+    responses to slow clients happens on the event loop, so a slow client holds no thread
+    and never delays the collection of another scrape. The health probes are answered on
+    the event loop, so they succeed while every thread renders a slow scrape.
+    """
+
+    def __init__(self, respond, workers=4, idle_timeout=60, probes=None):
+        """
+        :param respond: callable (path, query string, headers) -> (status, headers, body) built by make_responder
+        :param workers: threads rendering responses
+        :param idle_timeout: seconds a keep-alive connection may stay idle
+        :param probes: mapping of path to non-blocking callable () -> (status, headers, body) built by make_probes
+        """
+        self.respond = respond
+        self.probes = probes or {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="exporter-render")
+        self.idle_timeout = idle_timeout
+
+    async def read_request(self, reader):
+        """
+        :return:
+        (method, target, version, headers) or None when the client closed the connection
+        """
+        line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not line.strip():
+            return None
+        method, target, version = line.decode("latin-1").split()
+        headers = {}
+        for _ in range(MAX_HEADERS):
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ValueError("Too many request headers")
+        return method, target, version, headers
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers = request
+                url = urlsplit(target)
+                probe = self.probes.get(url.path)
+                if probe is not None:
+                    status, response_headers, body = probe()
+                else:
+                    status, response_headers, body = await loop.run_in_executor(
+                        self.executor, self.respond, url.path, url.query, headers
+                    )
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                response_headers = response_headers + [
+                    ("Content-Length", str(len(body))),
+                    ("Connection", "keep-alive" if keep_alive else "close"),
+                ]
+                head = f"HTTP/1.1 {status}\r\n" + "".join(f"{name}: {value}\r\n" for name, value in response_headers)
+                writer.write(head.encode("latin-1") + b"\r\n")
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as error:
+            logger.warning(f"Failed to answer HTTP request: {error!r}")
+        finally:
+            writer.close()
+
+    async def serve(self, addr, port):
+        server = await asyncio.start_server(self.handle, addr, port)
+        async with server:
+            await server.serve_forever()
+
+
+def start_async_server(port, respond, addr="0.0.0.0", workers=4, probes=None):  # nosec
+    """Run an AsyncServer answering with respond on its own event loop thread."""
+    server = AsyncServer(respond, workers=workers, probes=probes)
+    thread = threading.Thread(target=asyncio.run, args=(server.serve(addr, port),), name="exporter-http", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+from base64 import urlsafe_b64decode
+
+from .logger_helper import get_logger
+
+logger = get_logger()
+
+# Wazuh default for auth_token_exp_timeout, used when the token carries no usable claims
+DEFAULT_TOKEN_LIFETIME = 900
+# Seconds between early renewal attempts after a failed one
+RENEW_RETRY_INTERVAL = 10
+
+
+def token_lifetime(token):
+    """
+    Read the lifetime of a Wazuh JWT from its claims
+    :param token: encoded JWT returned by the authenticate endpoint
+    :return:
+    lifetime in seconds or None if the token can not be decoded
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(urlsafe_b64decode(payload))
+        issued = claims.get("nbf", claims.get("iat"))
+        if issued is not None:
+            return float(claims["exp"]) - float(issued)
+        return float(claims["exp"]) - time.time()
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenManager:
+    """
+    Cache a bearer token and renew it ahead of its expiry.
+
+    The lifetime is taken from the token claims and applied to the local clock,
+    so a skew between the exporter and the manager does not shorten the cache.
+    A failed early renewal is only logged, the current token is served until it expires.
+    """
+
+    def __init__(self, authenticate, renew_before=60):
+        self.authenticate = authenticate
+        self.renew_before = renew_before
+        self.token = None
+        self.expires_at = 0.0
+        self.error = None
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+
+    def valid(self):
+        return self.token is not None and time.monotonic() < self.expires_at
+
+    def get(self):
+        with self.lock:
+            now = time.monotonic()
+            if not self.valid():
+                self.refresh()
+            elif now >= self.expires_at - self.renew_before and now >= self.retry_at:
+                try:
+                    self.renew()
+                except Exception as error:
+                    self.retry_at = now + RENEW_RETRY_INTERVAL
+                    logger.warning(
+                        f"Unable to renew the Wazuh API token, keep using it for {self.expires_at - now:.0f}s: {error}"
+                    )
+            return self.token
+
+    def refresh(self):
+        try:
+            self.renew()
+        except Exception as error:
+            self.error = error
+            raise
+
+    def renew(self):
+        issued_at = time.monotonic()
+        token = self.authenticate()
+        self.error = None
+        self.retry_at = 0.0
+        lifetime = token_lifetime(token)
+        if lifetime is None:
+            logger.warning(f"Unable to read Wazuh token expiry, assume {DEFAULT_TOKEN_LIFETIME}s lifetime")
+            lifetime = DEFAULT_TOKEN_LIFETIME
+        self.token = token
+        self.expires_at = issued_at + lifetime
+        logger.debug(f"Wazuh API token renewed, valid for {lifetime:.0f}s")
+
+    def invalidate(self, token):
+        """Drop the cached token unless another thread already renewed it."""
+        with self.lock:
+            if self.token == token:
+                self.token = None
+                self.expires_at = 0.0
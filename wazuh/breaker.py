@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+
+from prometheus_client import Counter
+from prometheus_client.metrics_core import GaugeMetricFamily
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Stop calling an endpoint that keeps failing.
+
+    After ``failures`` consecutive failures the circuit opens and calls are rejected for
+    the backoff. Then one call is let through: its success closes the circuit, its failure
+    opens it again for twice the previous backoff, up to ``max_backoff``.
+    """
+
+    def __init__(self, failures=3, backoff=30, max_backoff=600):
+        self.threshold = failures
+        self.base_backoff = backoff
+        self.max_backoff = max_backoff
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = backoff
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() >= self.open_until:
+                # Half open, only the caller switching the state probes the endpoint
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.backoff = self.base_backoff
+
+    def failure(self):
+        """
+        :return:
+        True when the failure opened the circuit
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            elif self.failures < self.threshold or self.state == OPEN:
+                return False
+            self.state = OPEN
+            # Jitter keeps the circuits of several targets from probing together
+            self.open_until = time.monotonic() + self.backoff * random.uniform(0.9, 1.1)  # nosec
+            return True
+
+
+class CircuitBreakers:
+    """Circuit breaker of every endpoint, created on first use."""
+
+    def __init__(self, failures=3, backoff=30, max_backoff=600):
+        """
+        :param failures: consecutive failures opening a circuit, 0 disables the circuit breakers
+        :param backoff: seconds a circuit stays open after it first opened
+        :param max_backoff: seconds a circuit stays open at most
+        """
+        self.failures = failures
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.rejected = Counter(
+            "wazuh_exporter_circuit_rejected_calls",
+            "Wazuh endpoint calls skipped because the circuit of the endpoint is open",
+            ["endpoint"],
+            registry=None,
+        )
+        self.opened = Counter(
+            "wazuh_exporter_circuit_opened",
+            "Times the circuit of a Wazuh endpoint opened",
+            ["endpoint"],
+            registry=None,
+        )
+
+    def get(self, name):
+        with self.lock:
+            breaker = self.breakers.get(name)
+            if breaker is None:
+                breaker = self.breakers[name] = CircuitBreaker(self.failures, self.backoff, self.max_backoff)
+            return breaker
+
+    def allow(self, name):
+        if not self.failures or self.get(name).allow():
+            return True
+        self.rejected.labels(name).inc()
+        return False
+
+    def success(self, name):
+        if self.failures:
+            self.get(name).success()
+
+    def failure(self, name):
+        if self.failures and self.get(name).failure():
+            self.opened.labels(name).inc()
+
+    def collect(self):
+        metric = GaugeMetricFamily(
+            "wazuh_exporter_circuit_state",
+            "Circuit state of the Wazuh endpoint, 0 closed, 1 open, 2 half open",
+            labels=["endpoint"],
+        )
+        for name, breaker in sorted(self.breakers.items()):
+            metric.add_metric(labels=[name], value=STATE_VALUES[breaker.state])
+        yield metric
+        yield from self.rejected.collect()
+        yield from self.opened.collect()
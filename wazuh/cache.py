@@ -0,0 +1,53 @@
+import time
+
+from prometheus_client import Counter
+from prometheus_client.metrics_core import GaugeMetricFamily
+
+
+class TTLCache:
+    """
+    Keep the last answer of each endpoint for a per-endpoint time to live.
+
+    Endpoints without a TTL, or with a TTL of 0, are never served from the cache.
+    """
+
+    def __init__(self, ttls):
+        """
+        :param ttls: mapping of endpoint name to TTL in seconds
+        """
+        self.ttls = ttls
+        self.entries = {}
+        self.requests = Counter(
+            "wazuh_exporter_cache_requests",
+            "Wazuh endpoint cache lookups by result",
+            ["endpoint", "result"],
+            registry=None,
+        )
+
+    def lookup(self, name):
+        """
+        :return:
+        (True, data) on a hit, (False, None) on a miss
+        """
+        entry = self.entries.get(name)
+        if entry is not None and time.monotonic() - entry[0] < self.ttls.get(name, 0):
+            self.requests.labels(name, "hit").inc()
+            return True, entry[1]
+        self.requests.labels(name, "miss").inc()
+        return False, None
+
+    def store(self, name, data):
+        if self.ttls.get(name, 0) > 0:
+            self.entries[name] = (time.monotonic(), data)
+
+    def collect(self):
+        yield from self.requests.collect()
+        metric = GaugeMetricFamily(
+            "wazuh_exporter_cache_age_seconds",
+            "Seconds since the cached endpoint data was fetched from the Wazuh API",
+            labels=["endpoint"],
+        )
+        now = time.monotonic()
+        for name, entry in sorted(self.entries.items()):
+            metric.add_metric(labels=[name], value=now - entry[0])
+        yield metric
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+
+from prometheus_client import Counter
+
+# Labels telling the samples of a single histogram or summary series apart
+SAMPLE_LABELS = ("le", "quantile")
+
+
+class CardinalityGuard:
+    """
+    Keep every metric family within a series and label value budget.
+
+    Label values longer than the budget are truncated and suffixed with a hash of the full
+    value, so distinct values stay distinct. A series is a distinct label set, all the samples
+    of a histogram or summary series are kept or dropped together. The series of a family are
+    admitted until the budget is used and stay admitted while they are exported, the series
+    seen first win over new ones. Admitted series not exported during the retention are
+    forgotten, so label values changing over time, like agents or rules, can not grow the
+    family past the budget across scrapes either. Both are counted by family only, as label
+    names can be built from response data too, so an exploding family shows up in the exporter
+    metrics instead of in the Prometheus memory.
+    """
+
+    def __init__(self, max_series=50000, max_label_length=1024, retention=3600):
+        """
+        :param max_series: series kept per family, 0 disables the limit
+        :param max_label_length: characters kept per label value, 0 disables the limit
+        :param retention: seconds an admitted series not exported anymore keeps its place in the budget
+        """
+        self.max_series = max_series
+        self.max_label_length = max_label_length
+        self.retention = retention
+        self.lock = threading.Lock()
+        # Admitted series by family, label set to the last time it was exported
+        self.series = {}
+        self.dropped = Counter(
+            "wazuh_exporter_dropped_series",
+            "Series dropped because their family exceeded the series budget, counted per scrape",
+            ["family"],
+            registry=None,
+        )
+        self.truncated = Counter(
+            "wazuh_exporter_truncated_label_values",
+            "Label values truncated because they exceeded the label value budget",
+            ["family"],
+            registry=None,
+        )
+
+    def shorten(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=4).hexdigest()
+        return f"{value[:self.max_label_length - len(digest) - 1]}~{digest}"
+
+    def apply(self, families):
+        """
+        :param families: metric families, their samples are replaced when over budget
+        :return:
+        generator of the guarded families
+        """
+        for family in families:
+            samples = family.samples
+            if self.max_series:
+                samples = self.admit(family.name, samples)
+            if self.max_label_length:
+                samples = [self.shorten_labels(family.name, sample) for sample in samples]
+            family.samples = samples
+            yield family
+
+    def admit(self, family, samples):
+        """
+        :param family: name of the family
+        :param samples: samples of the family
+        :return:
+        samples of the series within the budget of the family
+        """
+        now = time.monotonic()
+        kept = []
+        dropped = set()
+        with self.lock:
+            admitted = self.series.setdefault(family, {})
+            expired = False
+            for sample in samples:
+                key = frozenset(item for item in sample.labels.items() if item[0] not in SAMPLE_LABELS)
+                if key not in admitted:
+                    if key in dropped:
+                        continue
+                    if len(admitted) >= self.max_series and not expired:
+                        self.expire(admitted, now)
+                        expired = True
+                    if len(admitted) >= self.max_series:
+                        dropped.add(key)
+                        continue
+                admitted[key] = now
+                kept.append(sample)
+        if dropped:
+            self.dropped.labels(family).inc(len(dropped))
+        return kept
+
+    def expire(self, admitted, now):
+        for key in [key for key, seen in admitted.items() if now - seen > self.retention]:
+            del admitted[key]
+
+    def shorten_labels(self, family, sample):
+        long_labels = [name for name, value in sample.labels.items() if len(value) > self.max_label_length]
+        if not long_labels:
+            return sample
+        # Label dicts can be shared between scrapes, never modify them
+        labels = dict(sample.labels)
+        for name in long_labels:
+            labels[name] = self.shorten(labels[name])
+            self.truncated.labels(family).inc()
+        return sample._replace(labels=labels)
+
+    def collect(self):
+        yield from self.dropped.collect()
+        yield from self.truncated.collect()
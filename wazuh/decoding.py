@@ -0,0 +1,103 @@
+import codecs
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CHUNK_SIZE = 65536
+# Bytes read before giving up on finding the affected items at the start of an answer
+HEAD_SIZE = 4096
+HEAD = re.compile(r'\s*\{\s*"data"\s*:\s*\{\s*"affected_items"\s*:\s*\[')
+SEPARATORS = re.compile(r"[\s,]*")
+DECODER = json.JSONDecoder()
+
+
+def loads(data):
+    """
+    Decode a JSON document, with orjson when it is installed
+    :param data: bytes or str
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class AffectedItems:
+    """
+    Items of data.affected_items decoded one by one while a Wazuh API answer is read.
+
+    Only the item being decoded and the current chunk are held in memory, whatever the number
+    of items. Once the items are exhausted, ``document`` holds the rest of the answer, e.g.
+    data.total_affected_items, with an empty affected_items list. An answer not starting with
+    data.affected_items is read and decoded whole.
+    """
+
+    def __init__(self, chunks):
+        """
+        :param chunks: iterable of the answer bytes
+        """
+        self.chunks = chunks
+        self.reader = iter(chunks)
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.document = None
+
+    def read(self):
+        """
+        Append the next chunk to the buffer
+        :return:
+        False at the end of the answer
+        """
+        chunk = next(self.reader, None)
+        if chunk is None:
+            self.buffer += self.text.decode(b"", final=True)
+            return False
+        self.buffer += self.text.decode(chunk)
+        return True
+
+    def __iter__(self):
+        try:
+            yield from self.decode()
+        finally:
+            close = getattr(self.chunks, "close", None)
+            if close is not None:
+                close()
+
+    def decode(self):
+        while len(self.buffer) < HEAD_SIZE and self.read():
+            pass
+        head = HEAD.match(self.buffer)
+        if head is None:
+            while self.read():
+                pass
+            self.document = loads(self.buffer)
+            yield from self.document["data"]["affected_items"]
+            return
+        position = head.end()
+        while True:
+            # Separators are skipped, the items themselves are checked by the decoder
+            position = SEPARATORS.match(self.buffer, position).end()
+            if position < len(self.buffer) and self.buffer[position] == "]":
+                break
+            try:
+                item, end = DECODER.raw_decode(self.buffer, position)
+            except ValueError:
+                end = None
+            # An item is always followed by , or ] so one ending the buffer may continue in the next chunk
+            if end is None or end == len(self.buffer):
+                self.buffer = self.buffer[position:]
+                position = 0
+                if not self.read():
+                    # Raises the decoding error of an invalid item
+                    DECODER.raw_decode(self.buffer)
+                    raise ValueError("Wazuh API answer ends within data.affected_items")
+                continue
+            yield item
+            position = end
+        self.buffer = self.buffer[position:]
+        while self.read():
+            pass
+        self.document = loads(head.group() + self.buffer)
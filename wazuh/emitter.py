@@ -0,0 +1,84 @@
+from collections import namedtuple
+
+from prometheus_client.metrics_core import Metric
+from prometheus_client.samples import Sample
+
+# since is inclusive and until exclusive, None leaves the range open
+Field = namedtuple("Field", ["name", "since", "until"], defaults=(None, None))
+
+
+def parse_version(version):
+    """
+    Parse a Wazuh version such as "4.7.1" or "v4.3.10"
+    :return:
+    version tuple or None if the version is unknown
+    """
+    try:
+        return tuple(int(part) for part in str(version).lstrip("v").split(".")[:3])
+    except (TypeError, ValueError):
+        return None
+
+
+class FieldEmitter:
+    """
+    Build a metric family from a declarative table of response fields.
+
+    The fields valid for a Wazuh version are resolved once per version and label set,
+    together with their label dicts, so emitting a response is a single pass that only
+    appends samples. Fields missing from a response are skipped and counted.
+    """
+
+    def __init__(self, endpoint, family, documentation, label, fields, sample_name=None, metric_type="gauge"):
+        """
+        :param endpoint: endpoint name used when counting missing fields
+        :param label: label holding the field name
+        :param fields: Field table
+        :param sample_name: sample name of every field, the field name when None
+        """
+        self.endpoint = endpoint
+        self.family = family
+        self.documentation = documentation
+        self.label = label
+        self.fields = tuple(fields)
+        self.sample_name = sample_name
+        self.metric_type = metric_type
+        self.compiled = {}
+
+    def compile(self, version, labels):
+        compiled = []
+        for field in self.fields:
+            if version is not None:
+                if field.since is not None and version < field.since:
+                    continue
+                if field.until is not None and version >= field.until:
+                    continue
+            sample_labels = dict(labels)
+            sample_labels[self.label] = field.name
+            compiled.append((field.name, self.sample_name or field.name, sample_labels))
+        return tuple(compiled)
+
+    def emit(self, items, version, missing, labels=(), metric=None):
+        """
+        :param items: response items, one dict of fields per item
+        :param version: parsed Wazuh version
+        :param missing: counter labelled by endpoint and field incremented for every missing field
+        :param labels: constant (name, value) label pairs added to every sample
+        :param metric: family to append the samples to, a new family is created when None
+        :return:
+        metric family
+        """
+        key = (version, labels)
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            compiled = self.compiled[key] = self.compile(version, labels)
+        if metric is None:
+            metric = Metric(self.family, self.documentation, self.metric_type)
+        samples = metric.samples
+        for item in items:
+            for field, sample_name, sample_labels in compiled:
+                value = item.get(field)
+                if value is None:
+                    missing.labels(self.endpoint, field).inc()
+                    continue
+                samples.append(Sample(sample_name, sample_labels, value))
+        return metric
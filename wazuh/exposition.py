@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+
+from prometheus_client.exposition import choose_encoder
+
+
+class Rendition:
+    """Immutable exposition of one format, the gzip body is built once on first use."""
+
+    def __init__(self, content_type, body, rendered_at):
+        self.content_type = content_type
+        self.body = body
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+        self.last_modified = formatdate(rendered_at, usegmt=True)
+        self.gzip_body = None
+        self.lock = threading.Lock()
+
+    def compressed(self):
+        with self.lock:
+            if self.gzip_body is None:
+                self.gzip_body = gzip.compress(self.body)
+            return self.gzip_body
+
+
+class ExpositionCache:
+    """
+    Render the exposition of a registry once per data refresh and serve the same bytes to every scraper.
+
+    A rendition is reused until the data version changes or it gets older than max_age, which keeps
+    the process and exporter metrics moving when the Wazuh data does not change.
+    """
+
+    def __init__(self, registry, version, max_age=30):
+        """
+        :param registry: prometheus registry
+        :param version: callable returning a value that changes whenever the collected data changes
+        :param max_age: seconds a rendition is served at most
+        """
+        self.registry = registry
+        self.version = version
+        self.max_age = max_age
+        self.renditions = {}
+        self.lock = threading.Lock()
+
+    def get(self, accept):
+        """
+        :param accept: Accept header of the request
+        :return:
+        Rendition of the negotiated format
+        """
+        encoder, content_type = choose_encoder(accept)
+        version = self.version()
+        entry = self.renditions.get(content_type)
+        if entry is not None and entry[0] == version and time.monotonic() - entry[1] < self.max_age:
+            return entry[2]
+        with self.lock:
+            # Scrapers waiting on the lock are served the rendition of the scraper holding it
+            entry = self.renditions.get(content_type)
+            if entry is not None and entry[0] == version and time.monotonic() - entry[1] < self.max_age:
+                return entry[2]
+            version = self.version()
+            rendition = Rendition(content_type, encoder(self.registry), time.time())
+            self.renditions[content_type] = (version, time.monotonic(), rendition)
+            return rendition
@@ -0,0 +1,42 @@
+import time
+
+
+class HealthCheck:
+    """
+    Answer liveness and readiness probes from in-process state only.
+
+    With background polling the exporter is ready when an endpoint was fetched from the
+    Wazuh API within ``max_age`` seconds and the last authentication did not fail. Otherwise
+    only scrapes query the Wazuh API, and a pod dropped from its Service would never be
+    scraped again, so the exporter is ready once a login or a fetch succeeded.
+    """
+
+    def __init__(self, token_manager, max_age=300, fresh=True):
+        """
+        :param fresh: require a recent fetch, for the background polling mode
+        """
+        self.token_manager = token_manager
+        self.max_age = max_age
+        self.fresh = fresh
+        self.last_success = None
+
+    def record_success(self):
+        self.last_success = time.monotonic()
+
+    def live(self):
+        return True, {"status": "ok"}
+
+    def ready(self):
+        age = None if self.last_success is None else time.monotonic() - self.last_success
+        state = {
+            "last_success_age_seconds": age,
+            "token_valid": self.token_manager.valid(),
+            "authentication_error": None if self.token_manager.error is None else repr(self.token_manager.error),
+        }
+        if self.fresh:
+            ready = age is not None and age <= self.max_age and self.token_manager.error is None
+        else:
+            # A token is kept once issued, even when a later renewal failed
+            ready = age is not None or self.token_manager.token is not None
+        state["status"] = "ok" if ready else "unavailable"
+        return ready, state
@@ -0,0 +1,49 @@
+from prometheus_client import Counter, Histogram
+
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class ClientMetrics:
+    """Latency, error and payload size metrics of the requests sent to the Wazuh API."""
+
+    def __init__(self):
+        self.request_duration = Histogram(
+            "wazuh_exporter_request_duration_seconds",
+            "Wazuh API request latency by endpoint and response status code",
+            ["endpoint", "status_code"],
+            buckets=REQUEST_BUCKETS,
+            registry=None,
+        )
+        self.request_errors = Counter(
+            "wazuh_exporter_request_errors",
+            "Wazuh API requests that failed or answered with an error status code",
+            ["endpoint", "status_code"],
+            registry=None,
+        )
+        self.response_size = Counter(
+            "wazuh_exporter_response_size_bytes",
+            "Bytes received from the Wazuh API by endpoint",
+            ["endpoint"],
+            registry=None,
+        )
+
+    def observe(self, endpoint, status_code, duration, size=0):
+        """
+        :param status_code: HTTP status code, or the exception name when no response was received
+        """
+        self.request_duration.labels(endpoint, status_code).observe(duration)
+        if not status_code.isdigit() or int(status_code) >= 400:
+            self.request_errors.labels(endpoint, status_code).inc()
+        self.received(endpoint, size)
+
+    def received(self, endpoint, size):
+        """
+        :param size: bytes of a response body, counted apart for the bodies read as a stream
+        """
+        if size:
+            self.response_size.labels(endpoint).inc(size)
+
+    def collect(self):
+        yield from self.request_duration.collect()
+        yield from self.request_errors.collect()
+        yield from self.response_size.collect()
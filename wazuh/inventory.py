@@ -0,0 +1,171 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from prometheus_client import Counter
+
+from .logger_helper import get_logger
+
+logger = get_logger()
+
+INACTIVE_STATUSES = ("disconnected", "pending", "never_connected")
+# Latest time an agent was known to keep alive, kept apart from the lastKeepAlive returned by the API
+SEEN_ACTIVE_AT = "seenActiveAt"
+
+
+class AgentIndex:
+    """
+    In-memory agent inventory keyed by agent id and kept up to date incrementally.
+
+    A delta sync only downloads the agents registered since the previous sync, the inactive
+    agents whose last keepalive is recent enough for them to have disconnected since, and the
+    id and keepalive of the active agents whose last keepalive is older than ``keepalive_lag``.
+    The number of inactive agents is then checked, only a mismatch, e.g. an agent that
+    reconnected, downloads the whole inactive list. The other active agents kept alive within
+    ``keepalive_lag`` seconds, their seenActiveAt is raised to that lower bound while their
+    lastKeepAlive keeps the value returned by the API. They are downloaded again by the periodic
+    full reconcile, which also picks up agent upgrades.
+    """
+
+    def __init__(
+        self,
+        client,
+        select,
+        page_size=500,
+        reconcile_interval=600,
+        overlap=60,
+        keepalive_lag=60,
+        disconnection_time=600,
+    ):
+        """
+        :param client: Wazuh client
+        :param select: agent fields kept in the index
+        :param reconcile_interval: seconds between two full downloads of the inventory
+        :param overlap: seconds subtracted from the previous sync time to absorb clock skew
+        :param keepalive_lag: seconds after which the keepalive of an active agent is downloaded on every sync
+        :param disconnection_time: agents_disconnection_time of the manager, seconds without keepalive after which
+        an agent is disconnected
+        """
+        self.client = client
+        self.select = sorted({"id", "status", "dateAdd", "lastKeepAlive", *select})
+        self.page_size = page_size
+        self.reconcile_interval = reconcile_interval
+        self.overlap = overlap
+        self.keepalive_lag = keepalive_lag
+        self.disconnection_time = disconnection_time
+        self.agents = {}
+        self.synced_at = None
+        self.reconciled_at = None
+        self.lock = threading.Lock()
+        self.syncs = Counter(
+            "wazuh_exporter_agent_index_syncs",
+            "Agent inventory synchronisations by mode",
+            ["mode"],
+            registry=None,
+        )
+        self.fetched = Counter(
+            "wazuh_exporter_agent_index_fetched_agents",
+            "Agents downloaded to keep the agent inventory up to date by mode",
+            ["mode"],
+            registry=None,
+        )
+
+    def sync(self):
+        """
+        Bring the index up to date
+        :return:
+        list of indexed agents
+        """
+        with self.lock:
+            if self.reconciled_at is None or time.monotonic() - self.reconciled_at >= self.reconcile_interval:
+                self.reconcile()
+            else:
+                self.delta()
+            return list(self.agents.values())
+
+    def iter_agents(self, mode, params=None):
+        for agent in self.client.wazuh_iter_agents(self.select, page_size=self.page_size, params=params):
+            self.fetched.labels(mode).inc()
+            yield agent
+
+    def reconcile(self):
+        started = datetime.now(timezone.utc)
+        self.agents = {agent["id"]: agent for agent in self.iter_agents("full")}
+        for agent in self.agents.values():
+            agent[SEEN_ACTIVE_AT] = agent.get("lastKeepAlive")
+        self.synced_at = started
+        self.reconciled_at = time.monotonic()
+        self.syncs.labels("full").inc()
+        logger.debug(f"Agent inventory reconciled, {len(self.agents)} agents")
+
+    def delta(self):
+        started = datetime.now(timezone.utc)
+        since = self.synced_at - timedelta(seconds=self.overlap)
+        changed = {
+            agent["id"]: agent
+            for agent in self.iter_agents("delta", {"q": f"dateAdd>{since.strftime('%Y-%m-%dT%H:%M:%S')}"})
+        }
+        # An agent disconnected since the previous sync kept alive last at most disconnection_time before it
+        disconnected_since = (since - timedelta(seconds=self.disconnection_time)).strftime("%Y-%m-%dT%H:%M:%S")
+        params = {"status": ",".join(INACTIVE_STATUSES), "q": f"lastKeepAlive>{disconnected_since}"}
+        changed.update((agent["id"], agent) for agent in self.iter_agents("delta", params))
+        self.agents.update(changed)
+        inactive = sum(agent.get("status") in INACTIVE_STATUSES for agent in self.agents.values())
+        if self.client.wazuh_count_agents({"status": ",".join(INACTIVE_STATUSES)}) != inactive:
+            # An inactive agent reconnected or was removed
+            changed.update(self.resync_inactive())
+        self.refresh_keepalives(started, set(changed))
+        self.synced_at = started
+        self.syncs.labels("delta").inc()
+
+    def resync_inactive(self):
+        """
+        Download the inactive agents and the previously inactive agents that are no longer inactive
+        :return:
+        downloaded agents by id
+        """
+        inactive = {
+            agent["id"]: agent
+            for agent in self.iter_agents("inactive", {"status": ",".join(INACTIVE_STATUSES)})
+        }
+        left_inactive = [
+            agent_id
+            for agent_id, agent in self.agents.items()
+            if agent.get("status") in INACTIVE_STATUSES and agent_id not in inactive
+        ]
+        changed = dict(inactive)
+        for start in range(0, len(left_inactive), self.page_size):
+            agents_list = ",".join(left_inactive[start:start + self.page_size])
+            for agent in self.iter_agents("inactive", {"agents_list": agents_list}):
+                changed[agent["id"]] = agent
+        for agent_id in left_inactive:
+            if agent_id not in changed:
+                # Neither inactive nor returned by id, the agent was removed
+                self.agents.pop(agent_id, None)
+        self.agents.update(changed)
+        return changed
+
+    def refresh_keepalives(self, started, fetched):
+        """
+        :param started: time the sync started
+        :param fetched: ids of the agents downloaded whole by this sync
+        """
+        params = {"status": "active", "older_than": f"{int(self.keepalive_lag)}s", "select": "id,lastKeepAlive,status"}
+        lagging = set()
+        for agent in self.iter_agents("keepalive", params):
+            if agent["id"] in self.agents:
+                self.agents[agent["id"]].update(agent)
+                lagging.add(agent["id"])
+        # Never later than the actual keepalive, an alert on the keepalive age stays correct above keepalive_lag
+        bound = (started - timedelta(seconds=self.keepalive_lag)).strftime("%Y-%m-%dT%H:%M:%S")
+        for agent_id, agent in self.agents.items():
+            keepalive = agent.get("lastKeepAlive")
+            if agent_id in lagging or agent_id in fetched or agent.get("status") != "active":
+                agent[SEEN_ACTIVE_AT] = keepalive
+            # Wazuh dates are UTC, the seconds part compares as text whatever the zone suffix
+            elif (agent.get(SEEN_ACTIVE_AT) or keepalive or "")[:19] < bound:
+                agent[SEEN_ACTIVE_AT] = f"{bound}+00:00"
+
+    def collect(self):
+        yield from self.syncs.collect()
+        yield from self.fetched.collect()
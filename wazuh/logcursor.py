@@ -0,0 +1,102 @@
+import threading
+from collections import Counter, deque
+
+from .logger_helper import get_logger
+
+logger = get_logger()
+
+ERROR_LEVELS = ("error", "critical")
+
+
+class LogCursor:
+    """
+    Follow /manager/logs incrementally and count the entries by tag and level.
+
+    Every poll only requests the entries at or after the newest timestamp already seen,
+    oldest first and page by page. Log timestamps have a one second resolution, so the
+    entries of the newest second are counted by content to skip them when they are returned
+    again, identical entries logged in the same second are all counted.
+    """
+
+    def __init__(self, client, page_size=500, max_entries=10000, recent_errors=0):
+        """
+        :param client: Wazuh client
+        :param page_size: log entries requested per page
+        :param max_entries: log entries read per poll at most, the rest is read by the next polls
+        :param recent_errors: error entries kept for the recent errors metric, 0 disables it
+        """
+        self.client = client
+        self.page_size = page_size
+        self.max_entries = max_entries
+        self.cursor = None
+        # Entries of the cursor second counted so far and read again by the current poll, by content
+        self.seen = Counter()
+        self.reread = Counter()
+        self.counts = Counter()
+        self.recent = deque(maxlen=recent_errors) if recent_errors > 0 else None
+        self.lock = threading.Lock()
+
+    def poll(self):
+        """
+        Read the new log entries
+        :return:
+        (counts by (tag, level), recent error entries)
+        """
+        with self.lock:
+            if self.cursor is None:
+                self.start()
+            else:
+                self.follow()
+            return dict(self.counts), list(self.recent or ())
+
+    def start(self):
+        # Begin at the newest entries, the history before the exporter started is not counted
+        self.cursor = ""
+        self.seen = Counter()
+        for log in self.client.wazuh_iter_logs({"offset": 0, "limit": self.page_size, "sort": "-timestamp"}):
+            if log["timestamp"] > self.cursor:
+                self.cursor = log["timestamp"]
+                self.seen = Counter()
+            if log["timestamp"] == self.cursor:
+                self.seen[entry_key(log)] += 1
+
+    def follow(self):
+        # The query stays on the cursor of the poll start, so the offset keeps paging the same result
+        since = self.cursor
+        self.reread = Counter()
+        read = 0
+        while read < self.max_entries:
+            params = {"offset": read, "limit": self.page_size, "sort": "+timestamp"}
+            if since:
+                params["q"] = f"timestamp>={since}"
+            # Pages are decoded while they are read, a large page size does not grow the memory used
+            count = 0
+            for log in self.client.wazuh_iter_logs(params):
+                self.add(log)
+                count += 1
+            read += count
+            if count < self.page_size:
+                return
+        logger.warning(f"Read {read} Wazuh log entries in one poll, the remaining entries are read on the next poll")
+
+    def add(self, log):
+        timestamp = log["timestamp"]
+        if timestamp < self.cursor:
+            return
+        if timestamp > self.cursor:
+            self.cursor = timestamp
+            self.seen = Counter()
+            self.reread = Counter()
+        # The first copies of an entry of the cursor second were counted by a previous poll
+        key = entry_key(log)
+        self.reread[key] += 1
+        if self.reread[key] <= self.seen[key]:
+            return
+        self.seen[key] += 1
+        self.counts[(log["tag"], log["level"])] += 1
+        if self.recent is not None and log["level"] in ERROR_LEVELS:
+            self.recent.append(log)
+
+
+def entry_key(log):
+    return log["timestamp"], log["tag"], log["level"], log["description"]
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from .logger_helper import get_logger
+
+logger = get_logger()
+
+
+class Poller:
+    """
+    Refresh groups of Wazuh endpoints from background threads.
+
+    Every group runs on its own interval. The latest data of every endpoint is kept in
+    ``results``, a dict that is replaced on each refresh and never mutated, so readers
+    can use it without locking.
+    """
+
+    def __init__(self, groups, fetch):
+        """
+        :param groups: mapping of group name to a (interval seconds, endpoint names) tuple
+        :param fetch: callable taking endpoint names and yielding (name, data) pairs,
+        data is None when the endpoint failed
+        """
+        self.groups = groups
+        self.fetch = fetch
+        self.results = {}
+        self.updated = {}
+        # Incremented whenever results changes
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start(self):
+        for group in self.groups:
+            thread = threading.Thread(target=self.run, args=(group,), name=f"wazuh-poll-{group}", daemon=True)
+            thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self, group):
+        interval, _ = self.groups[group]
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            self.refresh(group)
+            self.stopped.wait(max(0.0, interval - (time.monotonic() - started)))
+
+    def refresh(self, group):
+        _, names = self.groups[group]
+        try:
+            fetched = {name: data for name, data in self.fetch(names) if data is not None}
+        except Exception as error:
+            logger.warning(f"Background refresh of {group} failed: {error!r}")
+            return
+        with self.lock:
+            # Endpoints that failed keep their previous data until the next refresh
+            self.results = {**self.results, **fetched}
+            self.generation += 1
+            if len(fetched) == len(names):
+                self.updated[group] = time.monotonic()
+
+    def age(self, group):
+        """Seconds since every endpoint of the group was last refreshed, inf if never."""
+        updated = self.updated.get(group)
+        if updated is None:
+            return float("inf")
+        return time.monotonic() - updated
@@ -0,0 +1,161 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter
+from prometheus_client.metrics_core import GaugeMetricFamily
+
+context = threading.local()
+
+
+@contextmanager
+def request_priority(priority):
+    """
+    Set the rate limiter priority of the Wazuh API requests sent by this thread
+    :param priority: lower values are served first when the request budget is exhausted
+    """
+    previous = getattr(context, "priority", None)
+    context.priority = priority
+    try:
+        yield
+    finally:
+        context.priority = previous
+
+
+def current_priority():
+    """
+    :return:
+    rate limiter priority of the requests sent by this thread, 0 when none was set
+    """
+    priority = getattr(context, "priority", None)
+    return 0 if priority is None else priority
+
+
+def with_priority(function, priority=None):
+    """
+    Wrap function to send its requests with priority, the priority of the calling thread when None,
+    to hand a call over to another thread
+    """
+    if priority is None:
+        priority = current_priority()
+
+    def call():
+        with request_priority(priority):
+            return function()
+
+    return call
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every request sent to one Wazuh API.
+
+    The bucket holds up to ``burst`` tokens and is refilled at ``rate`` tokens per minute, every
+    request takes one token. When the bucket is empty requests wait in priority order, then in
+    arrival order, so the hot endpoints get the budget before the heavy collectors.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        :param rate: requests per minute, keep it under max_request_per_minute of the Wazuh API
+        :param burst: requests sent at once after an idle period
+        """
+        self.rate = rate / 60
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.consumed = Counter(
+            "wazuh_exporter_rate_limit_requests",
+            "Wazuh API requests that consumed a token of the request budget",
+            ["endpoint"],
+            registry=None,
+        )
+        self.throttled = Counter(
+            "wazuh_exporter_rate_limit_throttled_requests",
+            "Wazuh API requests that waited for the request budget",
+            ["endpoint"],
+            registry=None,
+        )
+        self.wait_seconds = Counter(
+            "wazuh_exporter_rate_limit_wait_seconds",
+            "Seconds Wazuh API requests waited for the request budget",
+            ["endpoint"],
+            registry=None,
+        )
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, endpoint, priority=0, deadline=None):
+        """
+        Wait for a token
+        :param endpoint: endpoint name used in the exporter metrics
+        :param deadline: time.monotonic() value after which the request is not sent, None to wait as long as needed
+        :return:
+        seconds waited
+        """
+        started = time.monotonic()
+        with self.condition:
+            self.refill()
+            if deadline is not None and self.updated >= deadline:
+                raise TimeoutError(f"Deadline passed before sending the {endpoint} request")
+            if not self.waiting and self.tokens >= 1:
+                self.tokens -= 1
+                self.consumed.labels(endpoint).inc()
+                return 0.0
+            entry = (priority, next(self.sequence))
+            heapq.heappush(self.waiting, entry)
+            while True:
+                self.refill()
+                if self.waiting[0] == entry and self.tokens >= 1:
+                    break
+                if deadline is not None and self.updated >= deadline:
+                    # The token goes to the next waiter
+                    self.waiting.remove(entry)
+                    heapq.heapify(self.waiting)
+                    self.condition.notify_all()
+                    raise TimeoutError(f"Deadline passed while the {endpoint} request waited for the request budget")
+                # Only the first waiter sleeps until the next token, the others wait for it to be served
+                timeout = (1 - self.tokens) / self.rate if self.waiting[0] == entry else None
+                if deadline is not None:
+                    timeout = deadline - self.updated if timeout is None else min(timeout, deadline - self.updated)
+                self.condition.wait(timeout)
+            heapq.heappop(self.waiting)
+            self.tokens -= 1
+            self.condition.notify_all()
+        waited = time.monotonic() - started
+        self.consumed.labels(endpoint).inc()
+        self.throttled.labels(endpoint).inc()
+        self.wait_seconds.labels(endpoint).inc(waited)
+        return waited
+
+    def collect(self):
+        with self.condition:
+            self.refill()
+            tokens = self.tokens
+            waiting = len(self.waiting)
+        metric = GaugeMetricFamily(
+            "wazuh_exporter_rate_limit_budget_per_minute", "Wazuh API requests the exporter sends per minute at most"
+        )
+        metric.add_metric([], self.rate * 60)
+        yield metric
+        metric = GaugeMetricFamily(
+            "wazuh_exporter_rate_limit_available_tokens", "Wazuh API requests that can be sent without waiting"
+        )
+        metric.add_metric([], tokens)
+        yield metric
+        metric = GaugeMetricFamily(
+            "wazuh_exporter_rate_limit_waiting_requests", "Wazuh API requests waiting for the request budget"
+        )
+        metric.add_metric([], waiting)
+        yield metric
+        yield from self.consumed.collect()
+        yield from self.throttled.collect()
+        yield from self.wait_seconds.collect()
@@ -0,0 +1,124 @@
+import threading
+import time
+from contextlib import contextmanager
+
+context = threading.local()
+
+
+@contextmanager
+def scrape_context(timeout=None, collectors=None):
+    """
+    Make the settings of the scrape being answered available to the collectors of this thread
+    :param timeout: scrape timeout sent by the scraper, None when it sent none
+    :param collectors: frozenset of the collector names selected by the scraper, None for every collector
+    """
+    previous = getattr(context, "timeout", None), getattr(context, "collectors", None)
+    context.timeout, context.collectors = timeout, collectors
+    try:
+        yield
+    finally:
+        context.timeout, context.collectors = previous
+
+
+def current_scrape_timeout():
+    """
+    :return:
+    scrape timeout of the request answered by this thread, None outside a scrape or when the scraper sent none
+    """
+    return getattr(context, "timeout", None)
+
+
+def current_collectors():
+    """
+    :return:
+    collector names selected by the request answered by this thread, None for every collector
+    """
+    return getattr(context, "collectors", None)
+
+
+def with_scrape_context(function):
+    """Wrap function to run with the scrape context of the calling thread, to hand a scrape over to another thread."""
+    timeout, collectors = current_scrape_timeout(), current_collectors()
+
+    def call():
+        with scrape_context(timeout, collectors):
+            return function()
+
+    return call
+
+
+@contextmanager
+def request_deadline(deadline):
+    """
+    Bound the Wazuh API calls made by this thread
+    :param deadline: time.monotonic() value after which the result of the calls is not used, None for no deadline
+    """
+    previous = getattr(context, "deadline", None)
+    context.deadline = deadline
+    try:
+        yield
+    finally:
+        context.deadline = previous
+
+
+def current_deadline():
+    """
+    :return:
+    deadline of the Wazuh API calls made by this thread, None when there is none
+    """
+    return getattr(context, "deadline", None)
+
+
+def with_deadline(function, deadline=None):
+    """
+    Wrap function to run with deadline, to hand a call over to another thread
+    :param deadline: the deadline of the calling thread when None
+    """
+    if deadline is None:
+        deadline = current_deadline()
+
+    def call():
+        with request_deadline(deadline):
+            return function()
+
+    return call
+
+
+def with_timeout(function, timeout, deadline=None):
+    """
+    Wrap function to run with a deadline timeout seconds after it starts, e.g. once a worker picked it up
+    :param deadline: time.monotonic() value capping the deadline, None for no cap
+    """
+
+    def call():
+        own_deadline = time.monotonic() + timeout
+        with request_deadline(own_deadline if deadline is None else min(own_deadline, deadline)):
+            return function()
+
+    return call
+
+
+def time_left(timeout, margin=0.0):
+    """
+    :param timeout: seconds wanted
+    :param margin: seconds kept before the deadline, e.g. for the caller to use the result
+    :return:
+    timeout capped by the seconds left until the deadline of this thread, at least 0
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return timeout
+    return max(0.0, min(timeout, deadline - margin - time.monotonic()))
+
+
+def parse_scrape_timeout(value):
+    """
+    Parse the X-Prometheus-Scrape-Timeout-Seconds header
+    :return:
+    positive number of seconds or None
+    """
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return seconds if seconds > 0 else None
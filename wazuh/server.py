@@ -0,0 +1,163 @@
+import gzip
+import json
+import threading
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from prometheus_client.exposition import ThreadingWSGIServer, choose_encoder
+
+from .scrape import parse_scrape_timeout, scrape_context
+
+
+class SilentHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):  # skipcq: PYL-W0622
+        """Do not log every probe and scrape."""
+
+
+def accepts_gzip(accept_encoding):
+    return "gzip" in [encoding.split(";")[0].strip() for encoding in (accept_encoding or "").split(",")]
+
+
+def text_response(status, message):
+    return status, [("Content-Type", "text/plain; charset=utf-8")], message.encode()
+
+
+def render(registry, accept, accept_encoding, params):
+    """
+    Render the exposition of registry in the format negotiated with the Accept header
+    :param params: parsed query string, name[] restricts the exposition to the given families
+    :return:
+    (status, headers, body)
+    """
+    encoder, content_type = choose_encoder(accept)
+    if "name[]" in params:
+        registry = registry.restricted_registry(params["name[]"])
+    body = encoder(registry)
+    headers = [("Content-Type", content_type)]
+    if accepts_gzip(accept_encoding):
+        body = gzip.compress(body)
+        headers.append(("Content-Encoding", "gzip"))
+    return "200 OK", headers, body
+
+
+def render_cached(exposition, accept, accept_encoding, if_none_match):
+    """
+    Answer with the pre-rendered exposition, or not modified when the client already holds it
+    :return:
+    (status, headers, body)
+    """
+    rendition = exposition.get(accept)
+    headers = [("Content-Type", rendition.content_type), ("Last-Modified", rendition.last_modified)]
+    if accepts_gzip(accept_encoding):
+        etag = rendition.gzip_etag
+        headers += [("ETag", etag), ("Content-Encoding", "gzip"), ("Vary", "Accept, Accept-Encoding")]
+        body = rendition.compressed()
+    else:
+        etag = rendition.etag
+        headers += [("ETag", etag), ("Vary", "Accept, Accept-Encoding")]
+        body = rendition.body
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return "304 Not Modified", headers, b""
+    return "200 OK", headers, body
+
+
+def make_probes(health):
+    """
+    :param health: HealthCheck answering /healthz and /readyz
+    :return:
+    mapping of probe path to callable () -> (status, headers, body), answered from memory without blocking
+    """
+
+    def answer(probe):
+        ok, state = probe()
+        status = "200 OK" if ok else "503 Service Unavailable"
+        return status, [("Content-Type", "application/json")], json.dumps(state).encode()
+
+    return {"/healthz": lambda: answer(health.live), "/readyz": lambda: answer(health.ready)}
+
+
+def make_responder(registry, health, targets=None, exposition=None, collectors=None):
+    """
+    Route a request to the health probes, the target registries or the metrics of registry
+    :param registry: prometheus registry
+    :param health: HealthCheck answering /healthz and /readyz
+    :param targets: mapping of target name to registry served by /probe?target=<name>
+    :param exposition: ExpositionCache serving the metrics of registry, rendered on every request when None
+    :param collectors: collector names a scrape can select with collect[] parameters
+    :return:
+    callable (path, query string, headers) -> (status, headers, body), headers keys are lower case
+    """
+    probes = make_probes(health)
+    targets = targets or {}
+    collectors = frozenset(collectors or ())
+
+    def respond(path, query_string, headers):
+        params = parse_qs(query_string or "")
+        selected = None
+        if "collect[]" in params:
+            selected = frozenset(params["collect[]"])
+            unknown = sorted(selected - collectors)
+            if unknown:
+                return text_response(
+                    "400 Bad Request",
+                    f"Unknown collectors {', '.join(unknown)}, available: {', '.join(sorted(collectors))}\n",
+                )
+        # Collectors read the scrape timeout and selection of the request from the thread answering it
+        timeout = parse_scrape_timeout(headers.get("x-prometheus-scrape-timeout-seconds"))
+        with scrape_context(timeout, selected):
+            return answer(path, params, headers)
+
+    def answer(path, params, headers):
+        accept = headers.get("accept")
+        accept_encoding = headers.get("accept-encoding")
+        if path == "/favicon.ico":
+            return "200 OK", [], b""
+        if path == "/probe" and targets:
+            target = params.get("target", [""])[0]
+            if not target:
+                return text_response("400 Bad Request", "Missing target parameter\n")
+            if target not in targets:
+                return text_response("404 Not Found", f"Unknown target {target}\n")
+            return render(targets[target], accept, accept_encoding, params)
+        probe = probes.get(path)
+        if probe is None:
+            if exposition is not None and "name[]" not in params and "collect[]" not in params:
+                return render_cached(exposition, accept, accept_encoding, headers.get("if-none-match"))
+            return render(registry, accept, accept_encoding, params)
+        return probe()
+
+    return respond
+
+
+def make_app(registry, health, targets=None, exposition=None, collectors=None):
+    """
+    WSGI app serving the health probes and the metrics of registry on every other path
+    :param registry: prometheus registry
+    :param health: HealthCheck answering /healthz and /readyz
+    :param targets: mapping of target name to registry served by /probe?target=<name>
+    :param exposition: ExpositionCache serving the metrics of registry
+    :param collectors: collector names a scrape can select with collect[] parameters
+    :return:
+    WSGI callable
+    """
+    respond = make_responder(registry, health, targets, exposition, collectors)
+
+    def app(environ, start_response):
+        headers = {
+            "accept": environ.get("HTTP_ACCEPT"),
+            "accept-encoding": environ.get("HTTP_ACCEPT_ENCODING"),
+            "if-none-match": environ.get("HTTP_IF_NONE_MATCH"),
+            "x-prometheus-scrape-timeout-seconds": environ.get("HTTP_X_PROMETHEUS_SCRAPE_TIMEOUT_SECONDS"),
+        }
+        status, response_headers, body = respond(environ.get("PATH_INFO"), environ.get("QUERY_STRING"), headers)
+        start_response(status, response_headers + [("Content-Length", str(len(body)))])
+        return [body]
+
+    return app
+
+
+def start_server(port, app, addr="0.0.0.0"):  # nosec
+    httpd = make_server(addr, port, app, ThreadingWSGIServer, handler_class=SilentHandler)
+    thread = threading.Thread(target=httpd.serve_forever, name="exporter-http", daemon=True)
+    thread.start()
+    return httpd
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import time
+import zlib
+
+from .logger_helper import get_logger
+
+logger = get_logger()
+
+SNAPSHOT_VERSION = 2
+
+
+class SnapshotStore:
+    """
+    Persist the last good data of every endpoint to a zlib compressed JSON file.
+
+    The file is written to a temporary file renamed over the previous snapshot, so a crash
+    while saving never leaves a truncated snapshot behind. Endpoint data that can not be
+    encoded as JSON, such as the log cursor counters, is not persisted.
+    """
+
+    def __init__(self, path, max_age=86400):
+        """
+        :param path: snapshot file
+        :param max_age: seconds after which a snapshot is too old to be loaded
+        """
+        self.path = path
+        self.max_age = max_age
+
+    def save(self, endpoints):
+        """
+        :param endpoints: mapping of endpoint name to data
+        """
+        encoded = {}
+        for name, data in endpoints.items():
+            try:
+                encoded[name] = json.dumps(data, separators=(",", ":"))
+            except (TypeError, ValueError):
+                logger.debug(f"Endpoint {name} can not be encoded, not persisted in the snapshot")
+        payload = '{"version":%d,"saved_at":%r,"endpoints":{%s}}' % (
+            SNAPSHOT_VERSION,
+            time.time(),
+            ",".join(f"{json.dumps(name)}:{data}" for name, data in encoded.items()),
+        )
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+        try:
+            with os.fdopen(descriptor, "wb") as snapshot:
+                snapshot.write(zlib.compress(payload.encode(), 6))
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def load(self):
+        """
+        :return:
+        (mapping of endpoint name to data, snapshot age in seconds), ({}, None) when there is no usable snapshot
+        """
+        try:
+            with open(self.path, "rb") as snapshot:
+                payload = json.loads(zlib.decompress(snapshot.read()))
+        except FileNotFoundError:
+            return {}, None
+        except (OSError, ValueError, zlib.error) as error:
+            logger.warning(f"Ignore unreadable snapshot {self.path}: {error!r}")
+            return {}, None
+        age = time.time() - payload.get("saved_at", 0)
+        if payload.get("version") != SNAPSHOT_VERSION or age > self.max_age:
+            logger.info(f"Ignore snapshot {self.path}, version {payload.get('version')}, {age:.0f}s old")
+            return {}, None
+        return payload["endpoints"], age
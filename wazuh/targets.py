@@ -0,0 +1,80 @@
+import json
+
+from prometheus_client.metrics_core import Metric
+
+TARGET_KEYS = ("name", "protocol", "host", "port", "user", "password")
+
+
+def load_targets(path, defaults):
+    """
+    Read the Wazuh managers to scrape from a JSON file holding a list of targets, e.g.
+    [{"name": "eu", "host": "wazuh-eu", "port": 55000, "user": "exporter", "password": "secret"}]
+    :param path: targets file
+    :param defaults: values used for the keys a target does not set, e.g. protocol or port
+    :return:
+    list of target dicts holding every key of TARGET_KEYS
+    """
+    with open(path, encoding="utf-8") as targets_file:
+        entries = json.load(targets_file)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must hold a non empty list of targets")
+    targets = []
+    for entry in entries:
+        target = {key: entry.get(key, defaults.get(key)) for key in TARGET_KEYS}
+        if not target["name"]:
+            target["name"] = target["host"]
+        missing = [key for key in TARGET_KEYS if not target[key]]
+        if missing:
+            raise ValueError(f"Target {target['name']} in {path} misses {', '.join(missing)}")
+        target["port"] = int(target["port"])
+        targets.append(target)
+    names = [target["name"] for target in targets]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicated target names in {path}: {', '.join(duplicates)}")
+    return targets
+
+
+def merge_families(results, label="target"):
+    """
+    Merge the metric families of several targets, the samples of every target are labelled with its name
+    :param results: iterable of (target name, metric families)
+    :param label: label holding the target name
+    :return:
+    list of merged metric families, one per family name
+    """
+    merged = {}
+    for name, families in results:
+        for family in families:
+            metric = merged.get(family.name)
+            if metric is None:
+                metric = merged[family.name] = Metric(family.name, family.documentation, family.type, family.unit)
+            for sample in family.samples:
+                labels = dict(sample.labels)
+                labels[label] = name
+                metric.samples.append(sample._replace(labels=labels))
+    return list(merged.values())
+
+
+class TargetsHealth:
+    """
+    Health of a multi-target exporter, ready as long as one target is ready so an
+    unreachable manager does not take the metrics of the other managers down.
+    """
+
+    def __init__(self, healths):
+        """
+        :param healths: mapping of target name to HealthCheck
+        """
+        self.healths = healths
+
+    def live(self):
+        return True, {"status": "ok"}
+
+    def ready(self):
+        targets = {}
+        ready = False
+        for name, health in self.healths.items():
+            ok, targets[name] = health.ready()
+            ready = ready or ok
+        return ready, {"status": "ok" if ready else "unavailable", "targets": targets}